@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
+import importlib.util
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -23,7 +24,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'gkxz)9*w15mf#-lb^(y^-37==t90p^jb@*irb#c_)+--j8kjf&'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG=0 in production, also turns off the browsable API
+DEBUG = bool(int(os.environ.get('DEBUG', 1)))
 
 ALLOWED_HOSTS = []
 
@@ -47,15 +49,36 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # answers /healthz and /readyz before anything else runs
+    'core.middleware.HealthCheckMiddleware',
+    # query count/time, serializer time and total time per request
+    'core.middleware.PerformanceMiddleware',
+    # per view request counters, latency and DB histograms for /metrics
+    'core.middleware.MetricsMiddleware',
+    # brotli/gzip for large API responses, timed by the middleware above
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # Browser* middleware are Django's own, skipped for the token
+    # authenticated STATELESS_URL_PREFIXES below
+    'core.middleware.BrowserSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.BrowserCsrfViewMiddleware',
+    'core.middleware.BrowserAuthenticationMiddleware',
+    'core.middleware.BrowserMessageMiddleware',
+    'core.middleware.BrowserXFrameOptionsMiddleware',
 ]
 
+# URL prefixes served without sessions, CSRF, messages or frame options
+STATELESS_URL_PREFIXES = ('/api/', '/metrics')
+
+# Response compression
+COMPRESSION_URL_PREFIXES = ('/api/',)
+# smaller responses are sent as they are
+COMPRESSION_MIN_SIZE = 1024
+# gzip 1-9, brotli 0-11: higher is smaller but slower, see bench_payloads
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_LEVEL = 5
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -116,6 +139,171 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# per process memory by default; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (ex: memcached) so limits hold across workers and hosts
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+# orjson encodes/decodes several times faster than the json module, see
+# bench_payloads. Without it DRF's own JSON classes are used
+_ORJSON = importlib.util.find_spec('orjson') is not None
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer' if _ORJSON
+        else 'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser' if _ORJSON
+        else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # proxies in front of the app appending to X-Forwarded-For (ex: 1
+    # behind nginx), 0: use the socket's address, clients can fake the header
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # token buckets: '5/min' allows bursts of 5, refilled at 5 a minute
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': '20/min',
+        'auth_email': '5/min',
+        'user_write': '120/min',
+    },
+}
+
+# compact binary responses for clients sending Accept: application/msgpack,
+# when msgpack is installed
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'core.renderers.MessagePackRenderer'
+    )
+# HTML pages to explore the API, in development only
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'rest_framework.renderers.BrowsableAPIRenderer'
+    )
+
+# cache holding the throttle buckets (falls back to per process memory
+# while it is unreachable)
+THROTTLE_CACHE = 'default'
+
+
+# Auth tokens
+# a token expires TOKEN_TTL seconds after login, or after TOKEN_IDLE_TTL
+# seconds without being used, whichever comes first
+TOKEN_TTL = int(os.environ.get('TOKEN_TTL', 30 * 24 * 3600))
+TOKEN_IDLE_TTL = int(os.environ.get('TOKEN_IDLE_TTL', 7 * 24 * 3600))
+# last_used is written at most once per interval per token, not on every
+# request
+TOKEN_LAST_USED_INTERVAL = 60
+# validated tokens are cached for this long, revoking one clears its entry.
+# Only with a cache shared by the workers (memcached, redis): the other
+# workers' local memory would keep accepting a revoked token. 0 disables
+TOKEN_CACHE = 'default'
+TOKEN_CACHE_SECONDS = int(os.environ.get(
+    'TOKEN_CACHE_SECONDS',
+    0 if CACHES[TOKEN_CACHE]['BACKEND'].endswith('LocMemCache') else 60
+))
+
+
+# Recipe summary
+# sections of the per user summary are dropped from the cache on writes,
+# the timeout only bounds how long a missed invalidation could last
+RECIPE_SUMMARY_CACHE = 'default'
+RECIPE_SUMMARY_CACHE_SECONDS = 3600
+
+# Shopping list and batch retrieve
+# most recipe ids in one shopping-list or batch request
+RECIPE_IDS_LIMIT = 100
+# most tag_names/ingredient_names in one recipe write, each may create a row
+RECIPE_NAMES_LIMIT = 50
+
+# Shared recipes
+# snapshots of published recipes are cached for this long, edits drop them
+SHARED_RECIPE_CACHE = 'default'
+SHARED_RECIPE_CACHE_SECONDS = 24 * 3600
+# Cache-Control of the public endpoint: browsers revalidate after
+# max-age, CDNs keep it for s-maxage and are purged on edits
+SHARED_RECIPE_MAX_AGE = 300
+SHARED_RECIPE_S_MAXAGE = 24 * 3600
+# dotted path of a function called with the surrogate keys to purge from
+# the CDN after an edit (None: rely on max-age only, set s-maxage lower)
+SHARED_RECIPE_PURGE = None
+
+# Shared catalog
+# entries per catalog page (?limit= may ask for up to the max)
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 500
+# names used by fewer users aren't listed: a name only one user has (an
+# email, a family recipe) would be visible to everyone
+CATALOG_MIN_USERS = int(os.environ.get('CATALOG_MIN_USERS', 3))
+
+
+# Recipe similarity
+# holds the version stamps of the per worker similarity indexes, must be
+# shared by the workers (CACHE_BACKEND memcached or redis)
+RECIPE_SIMILARITY_CACHE = 'default'
+# indexes kept per worker, the least recently used user's is dropped
+RECIPE_SIMILARITY_INDEXES = 100
+# seconds before an index is rebuilt anyway: bounds how long it misses
+# other workers' changes when the version stamps can't be seen
+RECIPE_SIMILARITY_MAX_AGE = int(
+    os.environ.get('RECIPE_SIMILARITY_MAX_AGE', 300)
+)
+
+
+# Delta sync
+# log entries per sync response, the client asks again while more is set
+SYNC_PAGE_SIZE = 1000
+# seconds a log entry waits before a token covers it: longer than any
+# transaction writing to the log, or a late commit could be skipped
+SYNC_COMMIT_WINDOW = int(os.environ.get('SYNC_COMMIT_WINDOW', 10))
+# prune_changelog deletes older entries, clients that didn't sync for
+# longer get a full snapshot
+CHANGELOG_RETENTION_DAYS = int(os.environ.get('CHANGELOG_RETENTION_DAYS', 30))
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.0/topics/auth/passwords/
+
+# hasher for new passwords: argon2, bcrypt or pbkdf2. Hashes made by the
+# others keep working and are upgraded to this one on the next login
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+_PASSWORD_HASHER_CLASSES = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASHER
+]
+
+# cost parameters, raising them rehashes passwords on the next login
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 180000))
+
+# hashes run on a bounded thread pool: at most WORKERS at once, BACKLOG
+# more may wait, further logins get a 503 instead of starving the CPU
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_BACKLOG = int(os.environ.get('PASSWORD_HASHING_BACKLOG', 32))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -141,3 +329,39 @@ STATIC_ROOT = '/vol/web/static'
 
 # Custom User Settings
 AUTH_USER_MODEL = 'core.User'  # core:app name and User:custom user model name
+
+# Health checks
+# seconds a /readyz result (DB ping + migrations check) is reused for
+READINESS_CACHE_SECONDS = 5
+
+# Metrics
+# addresses or networks allowed to scrape /metrics, comma separated (ex:
+# the Prometheus server's, 10.0.0.0/8). Same client IP as the throttles
+METRICS_ALLOWED_IPS = os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+
+# Performance instrumentation
+# send per request timings back in a Server-Timing header
+PERFORMANCE_SERVER_TIMING = True
+# requests running more queries than this are logged as possible N+1
+# (None disables the check)
+PERFORMANCE_QUERY_COUNT_THRESHOLD = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # INFO logs every request, WARNING only the possible N+1 ones
+        'core.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
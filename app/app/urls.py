@@ -18,7 +18,14 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core import views as core_views
+
 urlpatterns = [
+    # normally answered by core.middleware.HealthCheckMiddleware, routed here
+    # as well so they can be reversed and still work without the middleware
+    path('healthz', core_views.healthz, name='healthz'),
+    path('readyz', core_views.readyz, name='readyz'),
+    path('metrics', core_views.metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     # include all urls from user/urls.py file
     path('api/user/', include('user.urls')),
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import metrics
+from core.models import AuthToken
+
+
+def cache_key(key):
+    # hashed: keeps usable tokens out of the cache
+    return 'auth_token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def cache_token(token):
+    if not settings.TOKEN_CACHE_SECONDS:
+        return
+    try:
+        caches[settings.TOKEN_CACHE].set(
+            cache_key(token.key), token, settings.TOKEN_CACHE_SECONDS
+        )
+    except Exception:
+        pass
+
+
+def forget_tokens(keys):
+    """Drop cached validations, so changes to the tokens apply at once"""
+    try:
+        caches[settings.TOKEN_CACHE].delete_many(
+            [cache_key(key) for key in keys]
+        )
+    except Exception:
+        pass
+
+
+def revoke_tokens(queryset):
+    """Delete the tokens in queryset and return how many were revoked"""
+    keys = list(queryset.values_list('key', flat=True))
+    AuthToken.objects.filter(key__in=keys).delete()
+    forget_tokens(keys)
+    return len(keys)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Stop serving a cached copy of a user who changed (ex: deactivated)"""
+    if created:
+        return
+    forget_tokens(instance.auth_tokens.values_list('key', flat=True))
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """Token authentication with expiring tokens and cached validation
+
+    A validated token (with its user) is cached for TOKEN_CACHE_SECONDS,
+    so most requests skip the token query. Revocations only reach the
+    other workers through a shared TOKEN_CACHE, see app/settings.py.
+    last_used is written at most once per TOKEN_LAST_USED_INTERVAL
+    instead of on every request.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        token = self.cached_token(key)
+        cached = token is not None
+
+        if token is None:
+            try:
+                token = AuthToken.objects.select_related('user').get(key=key)
+            except AuthToken.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        now = timezone.now()
+        if token.is_expired(now):
+            forget_tokens([key])
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+        interval = timedelta(seconds=settings.TOKEN_LAST_USED_INTERVAL)
+        if now - token.last_used >= interval:
+            AuthToken.objects.filter(key=key).update(last_used=now)
+            token.last_used = now
+            cache_token(token)
+        elif not cached:
+            cache_token(token)
+
+        return (token.user, token)
+
+    def cached_token(self, key):
+        """Return the cached validation of key, None if there is none"""
+        if not settings.TOKEN_CACHE_SECONDS:
+            return None
+        try:
+            token = caches[settings.TOKEN_CACHE].get(cache_key(key))
+        except Exception:
+            token = None
+        metrics.cache_requests.inc(
+            cache='auth_token', result='miss' if token is None else 'hit'
+        )
+        return token
@@ -0,0 +1,447 @@
+import io
+import itertools
+import math
+import random
+import secrets
+import time
+from decimal import Decimal
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Max
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import compression
+from core.catalog import catalog_model, change_user_counts, link_catalog
+from core.instrumentation import RequestMetrics
+from core.models import AuthToken, ChangeLog, Tag, Ingredient, Recipe
+from core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, \
+    orjson
+from core.signals import actual_recipe_count
+
+from recipe import sharing
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (nearest-rank method)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(math.ceil(pct / 100.0 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Return mean/percentile statistics of durations in seconds as ms"""
+    count = len(samples)
+    total = sum(samples)
+    return {
+        'count': count,
+        'mean_ms': total / count * 1000 if count else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'throughput_rps': count / total if total else 0.0,
+    }
+
+
+def time_calls(fn, iterations, warmup=0):
+    """Call fn iterations times and return the duration of each call"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def generate_dataset(users=1, recipes=100, tags=20, ingredients=50,
+                     density=0.1, seed=0, password='benchmark1234'):
+    """Create users owning recipes, tags and ingredients for benchmarks
+
+    density is the share of a user's tags and ingredients linked to each of
+    their recipes. The same seed always produces the same data.
+    """
+    rng = random.Random(seed)
+    # hashing once keeps data generation fast, users still log in normally
+    password_hash = make_password(password)
+    user_model = get_user_model()
+    created = []
+    for index in range(users):
+        user = user_model.objects.create(
+            email=f'bench{seed}-{index}@bgwebagency.com',
+            name=f'Benchmark user {index}',
+            password=password_hash,
+        )
+        user_tags = [Tag(user=user, name=f'Tag {n}') for n in range(tags)]
+        user_ingredients = [
+            Ingredient(user=user, name=f'Ingredient {n}')
+            for n in range(ingredients)
+        ]
+        for model, objects in ((Tag, user_tags),
+                               (Ingredient, user_ingredients)):
+            # bulk_create sends no signals, link the catalog here
+            link_catalog(objects)
+            model.objects.bulk_create(objects)
+            change_user_counts(
+                catalog_model(model), [obj.canonical_id for obj in objects], 1
+            )
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Recipe {n}',
+                time_minutes=rng.randint(5, 120),
+                price=Decimal(rng.randint(100, 5000)) / 100,
+            )
+            for n in range(recipes)
+        ])
+        # some backends don't return primary keys from bulk_create
+        user_tags = list(Tag.objects.filter(user=user))
+        user_ingredients = list(Ingredient.objects.filter(user=user))
+        user_recipes = list(Recipe.objects.filter(user=user))
+
+        tag_links = []
+        ingredient_links = []
+        for recipe in user_recipes:
+            for tag in rng.sample(user_tags, round(density * len(user_tags))):
+                tag_links.append(Recipe.tags.through(
+                    recipe_id=recipe.id, tag_id=tag.id
+                ))
+            linked = rng.sample(
+                user_ingredients, round(density * len(user_ingredients))
+            )
+            for ingredient in linked:
+                ingredient_links.append(Recipe.ingredients.through(
+                    recipe_id=recipe.id, ingredient_id=ingredient.id
+                ))
+        Recipe.tags.through.objects.bulk_create(tag_links)
+        Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+        created.append(user)
+    # bulk_create sends no m2m_changed, count the links in one go
+    for model in (Tag, Ingredient):
+        model.objects.update(recipe_count=actual_recipe_count(model))
+    return created
+
+
+def sample_image():
+    """Return a small in-memory JPEG suitable for upload"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    buffer.name = 'benchmark.jpg'
+    return buffer
+
+
+def api_scenarios(user, password, requests):
+    """Return (name, request fn) pairs covering every API endpoint
+
+    Each scenario may be called up to requests times. Reads come first so
+    writes made by later scenarios don't change what the reads measure.
+    """
+    token = AuthToken.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    anonymous = APIClient()
+
+    tag_ids = list(
+        Tag.objects.filter(user=user).values_list('id', flat=True)[:2]
+    )
+    ingredient_ids = list(
+        Ingredient.objects.filter(user=user).values_list('id', flat=True)[:2]
+    )
+    recipe = Recipe.objects.filter(user=user).order_by('id').first()
+    recipe_ids = list(
+        Recipe.objects.filter(user=user).values_list('id', flat=True)[:20]
+    )
+    recipe_payload = {
+        'title': 'Benchmark recipe',
+        'time_minutes': 30,
+        'price': '9.99',
+        'tags': tag_ids,
+        'ingredients': ingredient_ids,
+    }
+    counter = itertools.count()
+    # the recipes listed in sync-changes were changed after since
+    since = ChangeLog.objects.aggregate(high=Max('id'))['high'] or 0
+    ChangeLog.objects.record('recipe', [(pk, user.pk) for pk in recipe_ids])
+    shared_slug = sharing.publish(recipe).slug
+
+    def disposable(make):
+        """Return a function returning one of the objects made by make
+        per call"""
+        pool = []
+
+        def pop():
+            if not pool:
+                # first (untimed) call makes the objects the others use up,
+                # so they don't show up in the read scenarios
+                pool.extend(make())
+            return pool.pop()
+        return pop
+
+    def make_recipes():
+        Recipe.objects.bulk_create([
+            Recipe(user=user, title='Disposable', time_minutes=1, price=1)
+            for _ in range(requests)
+        ])
+        return Recipe.objects.filter(
+            user=user, title='Disposable'
+        ).values_list('id', flat=True)
+
+    def make_tokens(owner=None):
+        tokens = [
+            AuthToken(user=owner or user, key=secrets.token_hex(20))
+            for _ in range(1 if owner else requests)
+        ]
+        AuthToken.objects.bulk_create(tokens)
+        return [token.key for token in tokens]
+
+    def make_users():
+        get_user_model().objects.bulk_create([
+            get_user_model()(
+                email=f'disposable{n}-{user.email}',
+                name='Disposable user',
+                password=user.password,
+            )
+            for n in range(requests)
+        ])
+        users = get_user_model().objects.filter(
+            email__startswith='disposable', email__endswith=user.email
+        )
+        return [make_tokens(owner)[0] for owner in users]
+
+    next_recipe = disposable(make_recipes)
+    next_token = disposable(make_tokens)
+    next_user_token = disposable(make_users)
+
+    def delete_recipe():
+        return client.delete(
+            reverse('recipe:recipe-detail', args=[next_recipe()])
+        )
+
+    def revoke_token():
+        return APIClient().post(
+            reverse('user:token-revoke'),
+            HTTP_AUTHORIZATION=f'Token {next_token()}'
+        )
+
+    def delete_user():
+        return APIClient().delete(
+            reverse('user:me'), HTTP_AUTHORIZATION=f'Token {next_user_token()}'
+        )
+
+    return [
+        ('user-me', lambda: client.get(reverse('user:me'))),
+        ('tag-list', lambda: client.get(reverse('recipe:tag-list'))),
+        ('tag-list-assigned', lambda: client.get(
+            reverse('recipe:tag-list'), {'assigned_only': 1}
+        )),
+        ('ingredient-list', lambda: client.get(
+            reverse('recipe:ingredient-list')
+        )),
+        ('ingredient-list-assigned', lambda: client.get(
+            reverse('recipe:ingredient-list'), {'assigned_only': 1}
+        )),
+        ('recipe-list', lambda: client.get(reverse('recipe:recipe-list'))),
+        ('recipe-list-filtered', lambda: client.get(
+            reverse('recipe:recipe-list'),
+            {'tags': ','.join(str(pk) for pk in tag_ids)}
+        )),
+        ('recipe-cookable', lambda: client.get(
+            reverse('recipe:recipe-cookable'),
+            {'ingredients': ','.join(str(pk) for pk in ingredient_ids),
+             'missing': 2}
+        )),
+        ('recipe-batch', lambda: client.get(
+            reverse('recipe:recipe-batch'),
+            {'ids': ','.join(str(pk) for pk in recipe_ids)}
+        )),
+        ('recipe-shopping-list', lambda: client.get(
+            reverse('recipe:recipe-shopping-list'),
+            {'ids': ','.join(str(pk) for pk in recipe_ids)}
+        )),
+        ('recipe-summary', lambda: client.get(
+            reverse('recipe:recipe-summary')
+        )),
+        ('recipe-detail', lambda: client.get(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        )),
+        ('recipe-similar', lambda: client.get(
+            reverse('recipe:recipe-similar', args=[recipe.id])
+        )),
+        ('recipe-shared', lambda: anonymous.get(
+            reverse('recipe:shared-recipe', args=[shared_slug])
+        )),
+        ('sync', lambda: client.get(reverse('recipe:sync'))),
+        ('sync-changes', lambda: client.get(
+            reverse('recipe:sync'), {'since': since}
+        )),
+        ('catalog-tag-list', lambda: client.get(
+            reverse('recipe:catalog-tag-list')
+        )),
+        ('catalog-ingredient-list', lambda: client.get(
+            reverse('recipe:catalog-ingredient-list'), {'search': 'ingr'}
+        )),
+        ('user-token', lambda: anonymous.post(reverse('user:token'), {
+            'email': user.email, 'password': password,
+        })),
+        ('user-create', lambda: anonymous.post(reverse('user:create'), {
+            'email': f'new{next(counter)}-{user.email}',
+            'password': password,
+            'name': 'New user',
+        })),
+        ('user-me-update', lambda: client.patch(
+            reverse('user:me'), {'name': 'Updated name'}
+        )),
+        ('tag-create', lambda: client.post(
+            reverse('recipe:tag-list'), {'name': 'New tag'}
+        )),
+        ('ingredient-create', lambda: client.post(
+            reverse('recipe:ingredient-list'), {'name': 'New ingredient'}
+        )),
+        ('recipe-create', lambda: client.post(
+            reverse('recipe:recipe-list'), recipe_payload, format='json'
+        )),
+        ('recipe-update', lambda: client.put(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            recipe_payload, format='json'
+        )),
+        ('recipe-partial-update', lambda: client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'title': 'Patched title'}, format='json'
+        )),
+        ('recipe-upload-image', lambda: client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': sample_image()}, format='multipart'
+        )),
+        ('recipe-publish', lambda: client.post(
+            reverse('recipe:recipe-publish', args=[recipe.id])
+        )),
+        ('recipe-delete', delete_recipe),
+        ('user-token-revoke', revoke_token),
+        ('user-delete', delete_user),
+    ]
+
+
+# rate limits would turn most benchmark requests into 429 responses, the
+# log entries written for sync-changes are synced at once
+@override_settings(
+    REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {}}, SYNC_COMMIT_WINDOW=0
+)
+def run_api_benchmark(user, password, iterations=50, warmup=5):
+    """Measure latency, throughput and query counts of every endpoint"""
+    results = {}
+    requests = iterations + warmup + 2
+    for name, request in api_scenarios(user, password, requests):
+        response = request()
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{name} failed with status {response.status_code}'
+            )
+        # count queries of a single request, then time the rest
+        counter = RequestMetrics()
+        with connection.execute_wrapper(counter):
+            request()
+        samples = time_calls(request, iterations, warmup=warmup)
+        results[name] = dict(summarize(samples), queries=counter.queries)
+    return results
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """Return regressions of current against baseline benchmark results
+
+    An endpoint regresses when it runs more queries than before, or when
+    its p50 latency grew by more than tolerance (0.2 = 20%).
+    """
+    regressions = []
+    for name, result in sorted(current.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {previous['queries']} -> {result['queries']} "
+                f"queries"
+            )
+        if result['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {previous['p50_ms']:.2f}ms -> "
+                f"{result['p50_ms']:.2f}ms"
+            )
+    return regressions
+
+
+# compression levels compared by run_payload_benchmark, the middleware
+# uses COMPRESSION_GZIP_LEVEL/COMPRESSION_BROTLI_LEVEL
+PAYLOAD_LEVELS = {'gzip': (1, 6, 9), 'br': (1, 5, 11)}
+
+
+def recipe_payloads(user):
+    """Return the data of the user's recipe list, plain and with details"""
+    recipes = list(
+        Recipe.objects.filter(user=user).order_by('id')
+        .prefetch_related('tags', 'ingredients')
+    )
+    return {
+        'recipes': RecipeSerializer(recipes, many=True).data,
+        'recipes-detail': RecipeDetailSerializer(recipes, many=True).data,
+    }
+
+
+def payload_renderers():
+    """Return {format: renderer} of the installed response formats"""
+    # DRF's JSONRenderer first, the baseline the others are compared to
+    renderers = {'json': JSONRenderer()}
+    if orjson is not None:
+        renderers['orjson'] = ORJSONRenderer()
+    if msgpack is not None:
+        renderers['msgpack'] = MessagePackRenderer()
+    return renderers
+
+
+def run_payload_benchmark(data, iterations=20, warmup=2):
+    """Measure size and CPU cost of every response format and encoding
+
+    Returns {format[+encoding-level]: result}: bytes sent, the share saved
+    against plain JSON and median render and compression times.
+    """
+    results = {}
+    baseline = None
+    for name, renderer in payload_renderers().items():
+        content = renderer.render(data)
+        render_ms = summarize(time_calls(
+            lambda: renderer.render(data), iterations, warmup=warmup
+        ))['p50_ms']
+        if baseline is None:
+            baseline = len(content)
+        variants = [(name, content, 0.0)]
+        for encoding in compression.ENCODINGS:
+            for level in PAYLOAD_LEVELS[encoding]:
+                compressed = compression.compress(encoding, content, level)
+                compress_ms = summarize(time_calls(
+                    lambda: compression.compress(encoding, content, level),
+                    iterations, warmup=warmup
+                ))['p50_ms']
+                variants.append(
+                    (f'{name}+{encoding}-{level}', compressed, compress_ms)
+                )
+        for variant, body, compress_ms in variants:
+            results[variant] = {
+                'bytes': len(body),
+                'saved': 1 - len(body) / baseline,
+                'render_ms': render_ms,
+                'compress_ms': compress_ms,
+                'total_ms': render_ms + compress_ms,
+            }
+    return results
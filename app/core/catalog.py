@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+
+# Tags and ingredients belong to a user, but most users name the same
+# things: every Tag/Ingredient points to the shared CatalogTag/
+# CatalogIngredient entry of its name. Catalog wide queries (most used
+# ingredients, search across users) read the small catalog tables instead
+# of grouping millions of user rows by name.
+#
+# user_count is the number of distinct users, not of rows: a user may
+# have several tags of one name, only their first counts them in and only
+# their last counts them out. Otherwise one user could push any name past
+# CATALOG_MIN_USERS on their own.
+
+
+def catalog_name(name):
+    """Return the catalog form of a tag/ingredient name"""
+    # ' Olive  oil' and 'olive oil' are the same ingredient
+    return ' '.join(name.split()).lower()
+
+
+def catalog_model(model):
+    """Return the catalog model of Tag or Ingredient"""
+    return model._meta.get_field('canonical').related_model
+
+
+def catalog_entries(catalog, names):
+    """Return {catalog name: entry} for names, adding the missing entries
+
+    One SELECT, and an INSERT and a SELECT if some names are new.
+    """
+    keys = {catalog_name(name) for name in names}
+    entries = {
+        entry.name: entry for entry in catalog.objects.filter(name__in=keys)
+    }
+    missing = keys - entries.keys()
+    if missing:
+        # other requests may add the same names meanwhile: conflicting
+        # rows are skipped, then every entry is read back
+        catalog.objects.bulk_create(
+            [catalog(name=name) for name in missing], ignore_conflicts=True
+        )
+        entries.update(
+            (entry.name, entry)
+            for entry in catalog.objects.filter(name__in=missing)
+        )
+    return entries
+
+
+def link_catalog(objects):
+    """Set the catalog entry of unsaved tags (or ingredients) before a
+    bulk_create, which sends no pre_save"""
+    if not objects:
+        return
+    entries = catalog_entries(
+        catalog_model(type(objects[0])), [obj.name for obj in objects]
+    )
+    for obj in objects:
+        obj.canonical = entries[catalog_name(obj.name)]
+
+
+def change_user_counts(catalog, pks, delta):
+    """Add delta to the user_count of the catalog entries with pks, once
+    per occurrence of a pk"""
+    by_delta = defaultdict(list)
+    for pk, count in Counter(pk for pk in pks if pk is not None).items():
+        by_delta[count * delta].append(pk)
+    # usually a single UPDATE, entries are rarely repeated
+    for change, entry_pks in by_delta.items():
+        queryset = catalog.objects.filter(pk__in=entry_pks)
+        if change < 0:
+            queryset = queryset.filter(user_count__gte=-change)
+        queryset.update(user_count=F('user_count') + change)
+
+
+def unused_entries(model, user_id, entry_pks, exclude=()):
+    """Return the pks of entry_pks no tag (or ingredient) of the user
+    points to, leaving out the rows with pks in exclude
+
+    Those entries gain a user when one is added, lose one when one is
+    removed. One SELECT.
+    """
+    entry_pks = {pk for pk in entry_pks if pk is not None}
+    if not entry_pks:
+        return []
+    used = model.objects.filter(
+        user_id=user_id, canonical_id__in=entry_pks
+    ).exclude(pk__in=exclude).values_list('canonical_id', flat=True)
+    return list(entry_pks - set(used))
+
+
+def remove_user_counts(queryset):
+    """Take the user owning the tags (or ingredients) of queryset out of
+    the user_count of their catalog entries, one UPDATE"""
+    catalog_model(queryset.model).objects.filter(
+        pk__in=queryset.values('canonical'), user_count__gte=1
+    ).update(user_count=F('user_count') - 1)
@@ -0,0 +1,63 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+
+
+def gzip_compress(content, level=None):
+    if level is None:
+        level = settings.COMPRESSION_GZIP_LEVEL
+    # mtime=0: the same content always compresses to the same bytes
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def brotli_compress(content, level=None):
+    if level is None:
+        level = settings.COMPRESSION_BROTLI_LEVEL
+    return brotli.compress(content, quality=level)
+
+
+# {encoding: compress function}, preferred first
+ENCODINGS = {'gzip': gzip_compress}
+if brotli is not None:
+    # smaller than gzip at a similar CPU cost
+    ENCODINGS = dict(br=brotli_compress, **ENCODINGS)
+
+
+def parse_accept_encoding(header):
+    """Return {encoding: quality} of an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if encoding:
+            accepted[encoding.lower()] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """Return the best supported encoding accepted by the client, or None"""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        # on ties, the server's preference order wins
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(encoding, content, level=None):
+    """Compress content, at the configured level unless given one"""
+    return ENCODINGS[encoding](content, level)
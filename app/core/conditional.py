@@ -0,0 +1,69 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_etags
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    """Raised when If-Match doesn't match the current version"""
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('The resource was changed since you fetched it.')
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    """Return a weak ETag identifying parts (ids, timestamps, counts)"""
+    digest = hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    # weak: the same version is rendered as JSON or as the browsable API
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the client's copy is current, else None
+
+    Called before serializing, so an unchanged object costs no more than
+    the query finding its version.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp())
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def check_if_match(request, etag):
+    """Raise PreconditionFailed unless If-Match (if sent) matches etag"""
+    header = request.META.get('HTTP_IF_MATCH')
+    if not header:
+        return
+    etags = parse_etags(header)
+    # Django's If-Match check only does strong comparison, which a weak
+    # ETag never passes. Our ETags change with every write, comparing
+    # them weakly is enough to detect a concurrent update.
+    if '*' in etags or strip_weak(etag) in map(strip_weak, etags):
+        return
+    raise PreconditionFailed()
+
+
+def strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add ETag/Last-Modified, and make clients revalidate their copy"""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
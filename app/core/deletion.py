@@ -0,0 +1,116 @@
+import time
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from core.authentication import revoke_tokens
+from core.catalog import remove_user_counts
+from core.models import ChangeLog, PublishedRecipe, Recipe
+from core.signals import COUNTED_RELATIONS, recipes_deleted
+
+
+# Deleting a user with Django's collector loads all of its recipes, tags
+# and links in the request and deletes them in a few huge DELETEs.
+# Instead, users and recipes are soft deleted: a single UPDATE hides them
+# at once. purge_deleted then removes them in small batches, pausing
+# between batches so other queries get the tables in between.
+
+
+def soft_delete_recipes(queryset):
+    """Hide the recipes of queryset, return how many were deleted"""
+    recipes = list(queryset.values_list('pk', 'user_id'))
+    if not recipes:
+        return 0
+    with transaction.atomic():
+        Recipe.objects.filter(
+            pk__in=[pk for pk, _ in recipes]
+        ).update(deleted_at=timezone.now())
+        # counts, tombstones, caches: what post_delete would have updated
+        recipes_deleted.send(sender=Recipe, recipes=recipes)
+    return len(recipes)
+
+
+def deleted_email(user):
+    """Return the address a deleted user holds until purged"""
+    # .invalid never resolves (RFC 2606), the real one can sign up again
+    return f'{user.pk}@deleted.invalid'
+
+
+def soft_delete_user(user):
+    """Deactivate the user's account, its data is purged later"""
+    with transaction.atomic():
+        user.is_active = False
+        user.deleted_at = timezone.now()
+        user.email = deleted_email(user)
+        # post_save drops the cached tokens and public links
+        user.save(update_fields=['is_active', 'deleted_at', 'email'])
+        revoke_tokens(user.auth_tokens.all())
+        # its names leave the catalog now, purge_user won't count them
+        for model in COUNTED_RELATIONS.values():
+            remove_user_counts(model.objects.filter(user=user))
+
+
+def raw_delete(queryset):
+    """Delete the rows of queryset in one DELETE, without signals
+
+    Their receivers ran when the objects were soft deleted.
+    """
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def batches(queryset, batch_size, pause, *fields):
+    """Yield lists of (pk, *fields) of queryset until it is empty
+
+    The caller deletes each batch, the next one is read after pause
+    seconds.
+    """
+    while True:
+        batch = list(
+            queryset.order_by('pk').values_list('pk', *fields)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        if pause:
+            time.sleep(pause)
+
+
+def purge_recipes(queryset, batch_size=1000, pause=0):
+    """Remove the recipes of queryset with their links and images"""
+    image_storage = Recipe._meta.get_field('image').storage
+    purged = 0
+    for batch in batches(queryset, batch_size, pause, 'image'):
+        pks = [pk for pk, _ in batch]
+        images = [image for _, image in batch if image]
+        with transaction.atomic():
+            for through in COUNTED_RELATIONS:
+                through.objects.filter(recipe_id__in=pks).delete()
+            PublishedRecipe.objects.filter(recipe_id__in=pks).delete()
+            purged += raw_delete(Recipe.all_objects.filter(pk__in=pks))
+
+            # files can't be rolled back, delete them once the rows are
+            def delete_images(images=images):
+                for image in images:
+                    image_storage.delete(image)
+            transaction.on_commit(delete_images)
+    return purged
+
+
+def purge_user(user, batch_size=1000, pause=0):
+    """Remove a soft deleted user with its tags, ingredients and log
+
+    Its recipes must be purged first.
+    """
+    for through, model in COUNTED_RELATIONS.items():
+        column = model._meta.model_name
+        rows = model.objects.filter(user=user)
+        for batch in batches(rows, batch_size, pause):
+            pks = [row[0] for row in batch]
+            with transaction.atomic():
+                through.objects.filter(**{f'{column}_id__in': pks}).delete()
+                raw_delete(model.objects.filter(pk__in=pks))
+    entries = ChangeLog.objects.filter(user=user)
+    for batch in batches(entries, batch_size, pause):
+        ChangeLog.objects.filter(pk__in=[row[0] for row in batch]).delete()
+    # nothing left to collect but the tokens
+    user.delete()
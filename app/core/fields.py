@@ -0,0 +1,64 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Many related field resolving every submitted pk in a single query"""
+    default_error_messages = {
+        'does_not_exist': _('Invalid pks {pk_values} - objects do not exist.'),
+        'incorrect_type': _(
+            'Incorrect type. Expected pk values, received {data_type}.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            if isinstance(item, bool) or not isinstance(item, (int, str)):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                self.fail('incorrect_type', data_type=type(item).__name__)
+        # dict.fromkeys: drop repeated pks, keep the submitted order
+        pks = list(dict.fromkeys(pks))
+
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=pks)}
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            # all missing pks at once, not only the first one
+            self.fail('does_not_exist', pk_values=missing)
+        return [objects[pk] for pk in pks]
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field only accepting objects of the request's user
+
+    Other users' objects are reported as not existing. With many=True the
+    pks are resolved by BulkManyRelatedField in one id__in query.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(user=request.user)
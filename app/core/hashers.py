@@ -0,0 +1,141 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    """Raised when every hashing worker and backlog slot is taken"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many logins in progress, try again shortly.')
+    default_code = 'password_hashing_busy'
+
+
+class HashingPool:
+    """Bounded thread pool running password hashes off request threads
+
+    At most `workers` hashes run at once, so a burst of logins can't take
+    every CPU away from other requests. Up to `backlog` more callers may
+    wait for a worker; anyone beyond that fails fast with
+    PasswordHashingBusy instead of queueing indefinitely.
+    """
+
+    def __init__(self, workers, backlog):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing'
+        )
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+        self._local = threading.local()
+
+    def run(self, fn, *args):
+        """Run fn(*args) on a pool worker and return its result"""
+        # hashers call each other (PBKDF2 verify -> encode), run inline
+        # when already on a worker so nested calls can't deadlock the pool
+        if getattr(self._local, 'worker', False):
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            return self._executor.submit(self._call, fn, args).result()
+        finally:
+            self._slots.release()
+
+    def _call(self, fn, args):
+        self._local.worker = True
+        return fn(*args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process wide hashing pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    settings.PASSWORD_HASHING_BACKLOG
+                )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(**kwargs):
+    """Recreate the pool when its settings change (override_settings)"""
+    global _pool
+    if kwargs['setting'] in ('PASSWORD_HASHING_WORKERS',
+                             'PASSWORD_HASHING_BACKLOG'):
+        with _pool_lock:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = None
+
+
+def offload(fn, *args):
+    """Run a password hashing function on the bounded hashing pool"""
+    return get_pool().run(fn, *args)
+
+
+class OffloadedHasherMixin:
+    """Run the expensive parts of a hasher on the hashing pool"""
+
+    def encode(self, *args):
+        return offload(super().encode, *args)
+
+    def verify(self, password, encoded):
+        return offload(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return offload(super().harden_runtime, password, encoded)
+
+
+# Cost parameters are read from settings on every use, so raising them
+# makes Django rehash passwords with the new cost on the next login.
+# Algorithm names are unchanged: existing hashes keep verifying.
+
+class Argon2PasswordHasher(OffloadedHasherMixin,
+                           hashers.Argon2PasswordHasher):
+    """Argon2 with time/memory cost and parallelism from settings"""
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(OffloadedHasherMixin,
+                                 hashers.BCryptSHA256PasswordHasher):
+    """bcrypt (SHA256 pre-hashed) with the number of rounds from settings"""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(OffloadedHasherMixin,
+                           hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the number of iterations from settings"""
+
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS
@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+# metrics of the request being handled by the current thread
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Timings and DB query count collected while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        # nested serializers are timed as part of their parent
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time a DB query, installed with connection.execute_wrapper"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    @property
+    def total_time(self):
+        """Seconds the request took, or has taken so far"""
+        return (self.finished or time.perf_counter()) - self.started
+
+    def server_timing(self):
+        """Return the value of a Server-Timing header for these metrics"""
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+            f'serialize;dur={self.serializer_time * 1000:.2f}, '
+            f'total;dur={self.total_time * 1000:.2f}'
+        )
+
+
+def start_request():
+    """Start collecting metrics for the current thread's request"""
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def finish_request():
+    """Stop collecting metrics for the current thread"""
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.finished = time.perf_counter()
+    _local.metrics = None
+
+
+def current_metrics():
+    """Return the metrics of the request being handled, if any"""
+    return getattr(_local, 'metrics', None)
+
+
+class TimedSerializerMixin:
+    """Add the time spent serializing objects to the request metrics"""
+
+    def to_representation(self, instance):
+        metrics = current_metrics()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
@@ -0,0 +1,67 @@
+from django.db import router
+from django.db.models.signals import m2m_changed
+
+
+def sync_m2m(instance, field_name, objects, created=False):
+    """Make instance.<field_name> hold exactly objects, in a diff
+
+    Unlike manager.set(), the current links are read from the prefetch
+    cache when there is one (or not at all for a just created instance),
+    and the links to add and remove are written with one bulk INSERT and
+    one DELETE. m2m_changed is sent like .set() does, so receivers still
+    see every change. Call it inside a transaction.
+    """
+    field = instance._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    target_model = field.remote_field.model
+    using = router.db_for_write(through, instance=instance)
+
+    if created:
+        current = set()
+    elif field_name in getattr(instance, '_prefetched_objects_cache', {}):
+        current = {obj.pk for obj in getattr(instance, field_name).all()}
+    else:
+        current = set(
+            through.objects.using(using)
+            .filter(**{source: instance})
+            .values_list(f'{target}_id', flat=True)
+        )
+    wanted = {obj.pk for obj in objects}
+    removed = current - wanted
+    added = wanted - current
+
+    signal_kwargs = {
+        'sender': through, 'instance': instance, 'reverse': False,
+        'model': target_model, 'using': using,
+    }
+    if removed:
+        m2m_changed.send(action='pre_remove', pk_set=removed, **signal_kwargs)
+        through.objects.using(using).filter(**{
+            source: instance, f'{target}__in': removed,
+        }).delete()
+        m2m_changed.send(action='post_remove', pk_set=removed, **signal_kwargs)
+    if added:
+        m2m_changed.send(action='pre_add', pk_set=added, **signal_kwargs)
+        through.objects.using(using).bulk_create([
+            through(**{f'{source}_id': instance.pk, f'{target}_id': pk})
+            for pk in added
+        ])
+        m2m_changed.send(action='post_add', pk_set=added, **signal_kwargs)
+
+    prime_prefetch_cache(instance, field_name, objects)
+
+
+def prime_prefetch_cache(instance, field_name, objects):
+    """Store objects as the prefetched instance.<field_name>
+
+    Serializing the instance afterwards reads them from the cache instead
+    of querying the relation again. Same cache prefetch_related() fills.
+    """
+    queryset = getattr(instance, field_name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[field_name] = queryset
@@ -0,0 +1,111 @@
+import json
+import logging
+import platform
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """Django command to benchmark every API endpoint on synthetic data"""
+    help = 'Benchmark the API against generated data in a test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=50)
+        parser.add_argument(
+            '--density', type=float, default=0.1,
+            help='Share of tags/ingredients linked to each recipe'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Write results to this file')
+        parser.add_argument(
+            '--baseline', help='Compare with results of an earlier run'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p50 latency growth against the baseline'
+        )
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[name] for name in (
+                'users', 'recipes', 'tags', 'ingredients', 'density', 'seed',
+                'iterations', 'warmup',
+            )
+        }
+        # never touch real data: generate into a throwaway test database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            endpoints = self.run(params)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = {
+            'meta': dict(
+                params,
+                created=timezone.now().isoformat(),
+                python=platform.python_version(),
+                django=django.get_version(),
+                database=connection.vendor,
+            ),
+            'endpoints': endpoints,
+        }
+        for name, result in endpoints.items():
+            self.stdout.write(
+                '{name:<26} p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  '
+                'p99 {p99_ms:8.2f}ms  {throughput_rps:8.1f} req/s  '
+                '{queries:3d} queries'.format(name=name, **result)
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                previous = json.load(baseline)['endpoints']
+            regressions = benchmark.compare_results(
+                endpoints, previous, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions against baseline:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions'))
+
+    def run(self, params):
+        """Generate the dataset and benchmark every endpoint"""
+        password = 'benchmark1234'
+        users = benchmark.generate_dataset(
+            users=params['users'],
+            recipes=params['recipes'],
+            tags=params['tags'],
+            ingredients=params['ingredients'],
+            density=params['density'],
+            seed=params['seed'],
+            password=password,
+        )
+        # per request logging would be measured along with the API
+        for logger in ('django.request', 'core.performance'):
+            logging.getLogger(logger).setLevel(logging.CRITICAL)
+        # DEBUG keeps a log of every query, which production doesn't pay for
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                DEBUG=False, MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']):
+            return benchmark.run_api_benchmark(
+                users[0], password,
+                iterations=params['iterations'],
+                warmup=params['warmup'],
+            )
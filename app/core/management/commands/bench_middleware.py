@@ -0,0 +1,86 @@
+import logging
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils.module_loading import import_string
+
+from core.benchmark import summarize, time_calls
+from core.middleware import BrowserOnlyMixin
+
+
+def stock_middleware(middleware):
+    """Replace Browser* middleware with the Django classes they wrap"""
+    stock = []
+    for path in middleware:
+        cls = import_string(path)
+        if issubclass(cls, BrowserOnlyMixin):
+            # first base after the mixin is the original Django middleware
+            base = cls.__mro__[2]
+            path = f'{base.__module__}.{base.__name__}'
+        stock.append(path)
+    return stock
+
+
+class Command(BaseCommand):
+    """Django command to compare the request cycle cost of both pipelines"""
+    help = 'Microbenchmark the middleware stack for API requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=200)
+        # unauthenticated list request: full middleware + DRF auth stack,
+        # rejected with 401 before any DB access
+        parser.add_argument('--path', default='/api/recipe/recipes/')
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def run_pipeline(self, middleware, options):
+        """Return request durations through the given middleware"""
+        factory = RequestFactory()
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=['*']):
+            # same entry point the WSGI handler uses, without test client
+            # bookkeeping that would drown out the middleware cost
+            handler = BaseHandler()
+            handler.load_middleware()
+            return time_calls(
+                lambda: handler.get_response(factory.get(options['path'])),
+                options['requests'],
+                warmup=options['warmup']
+            )
+
+    def handle(self, *args, **options):
+        pipelines = (
+            ('stock', stock_middleware(settings.MIDDLEWARE)),
+            ('stateless', list(settings.MIDDLEWARE)),
+        )
+        samples = {name: [] for name, _ in pipelines}
+        # 4xx responses are logged by django.request, which would dominate
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            # alternate pipelines so warm caches and CPU scaling hit both
+            for _ in range(options['rounds']):
+                for name, middleware in pipelines:
+                    samples[name].extend(
+                        self.run_pipeline(middleware, options)
+                    )
+        finally:
+            request_logger.setLevel(previous_level)
+
+        results = {}
+        for name, _ in pipelines:
+            results[name] = summarize(samples[name])
+            self.stdout.write(
+                '{name:<10} mean {mean_ms:.3f}ms  p50 {p50_ms:.3f}ms  '
+                'p95 {p95_ms:.3f}ms  {throughput_rps:.0f} req/s'.format(
+                    name=name, **results[name]
+                )
+            )
+
+        saved = 1 - results['stateless']['mean_ms'] / \
+            results['stock']['mean_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f'Per-request overhead reduced by {saved:.1%}'
+        ))
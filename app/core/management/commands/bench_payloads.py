@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """Django command to compare response formats and compression"""
+    help = 'Benchmark bytes saved against CPU spent per response format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=50)
+        parser.add_argument(
+            '--density', type=float, default=0.1,
+            help='Share of tags/ingredients linked to each recipe'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', help='Write results to this file')
+
+    def handle(self, *args, **options):
+        # never touch real data: generate into a throwaway test database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = benchmark.generate_dataset(
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                density=options['density'],
+                seed=options['seed'],
+            )[0]
+            payloads = benchmark.recipe_payloads(user)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = {}
+        for payload, data in payloads.items():
+            self.stdout.write(f"{payload} ({options['recipes']} recipes)")
+            results[payload] = benchmark.run_payload_benchmark(
+                data, iterations=options['iterations']
+            )
+            for name, result in results[payload].items():
+                self.stdout.write(
+                    '  {name:<18} {bytes:>10,d} bytes  {saved:6.1%} saved  '
+                    'render {render_ms:7.2f}ms  compress {compress_ms:7.2f}ms'
+                    '  total {total_ms:7.2f}ms'.format(name=name, **result)
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Django command to delete expired auth tokens in batches"""
+    help = 'Delete expired auth tokens, a batch per short transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # select a batch of keys first: a DELETE by primary key only
+            # locks those rows, never the whole table
+            keys = list(
+                AuthToken.objects.expired(now)
+                .values_list('key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            deleted += AuthToken.objects.filter(key__in=keys).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired tokens')
+        )
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.deletion import purge_recipes, purge_user
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to remove soft deleted recipes and users in batches"""
+    help = 'Remove soft deleted recipes and users, a batch per short ' \
+        'transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        # deleted recipes, and all recipes of deleted users
+        recipes = purge_recipes(
+            Recipe.all_objects.filter(
+                Q(deleted_at__isnull=False) | Q(user__deleted_at__isnull=False)
+            ),
+            batch_size,
+            pause
+        )
+        users = 0
+        deleted = get_user_model().objects.filter(deleted_at__isnull=False)
+        for user in deleted.iterator():
+            purge_user(user, batch_size, pause)
+            users += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {recipes} recipes and {users} users'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from core.models import Tag, Ingredient
+from core.signals import actual_recipe_count
+
+
+class Command(BaseCommand):
+    """Django command to repair drifted tag/ingredient recipe counts"""
+    help = 'Recompute recipe_count of tags and ingredients that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            # ids first, then one UPDATE per batch of drifted rows
+            drifted = list(
+                model.objects.annotate(actual=actual_recipe_count(model))
+                .exclude(recipe_count=F('actual'))
+                .values_list('pk', flat=True)
+            )
+            for start in range(0, len(drifted), batch_size):
+                model.objects.filter(
+                    pk__in=drifted[start:start + batch_size]
+                ).update(recipe_count=actual_recipe_count(model))
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'{len(drifted)} counts repaired'
+            ))
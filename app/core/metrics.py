@@ -0,0 +1,208 @@
+import bisect
+import threading
+
+
+# every metric created below, in the order they are exported
+REGISTRY = []
+
+
+class Metric:
+    """Base class of lock-light metrics safe for multi-threaded workers
+
+    Each thread updates its own shard (a plain dict) without taking a lock;
+    the lock is only held when a thread registers its shard and while a
+    scrape merges the shards together.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _shard(self):
+        """Return the calling thread's shard, creating it on first use"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _key(self, labels):
+        """Return label values in labelnames order"""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _snapshot(self):
+        """Return (labels, value) pairs of every shard"""
+        with self._lock:
+            # list() over a dict runs without releasing the GIL in CPython,
+            # so owners can keep writing to their shards meanwhile
+            return [
+                item for shard in self._shards for item in list(shard.items())
+            ]
+
+    def _format_labels(self, key, extra=()):
+        """Return key rendered as a Prometheus label set"""
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(name, _escape(value)) for name, value in pairs
+        ) + '}'
+
+    def reset(self):
+        """Drop all recorded values (used by tests)"""
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def expose(self):
+        """Return the metric in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing value, e.g. requests served"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def values(self):
+        """Return the merged value of every label set"""
+        merged = {}
+        for key, value in self._snapshot():
+            merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def _samples(self):
+        for key, value in sorted(self.values().items()):
+            yield f'{self.name}{self._format_labels(key)} {value}'
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. request latencies"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(),
+                 registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # one slot per bucket plus +Inf, then the sum of observations
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def values(self):
+        """Return merged (bucket counts, sum) of every label set"""
+        merged = {}
+        for key, counts in self._snapshot():
+            total = merged.setdefault(key, [0] * len(counts))
+            for index, count in enumerate(list(counts)):
+                total[index] += count
+        return merged
+
+    def _samples(self):
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for key, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = self._format_labels(key, [('le', bound)])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = self._format_labels(key)
+            yield f'{self.name}_sum{labels} {counts[-1]}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def cache_hit_ratios():
+    """Return hits / lookups for every cache name seen so far"""
+    lookups = {}
+    for (cache, result), count in cache_requests.values().items():
+        hits, total = lookups.get(cache, (0, 0))
+        if result == 'hit':
+            hits += count
+        lookups[cache] = (hits, total + count)
+    return {
+        cache: hits / total for cache, (hits, total) in lookups.items()
+    }
+
+
+def render():
+    """Return every registered metric in the text exposition format"""
+    sections = [metric.expose() for metric in REGISTRY]
+    ratios = [
+        'cache_hit_ratio{{cache="{}"}} {}'.format(_escape(cache), ratio)
+        for cache, ratio in sorted(cache_hit_ratios().items())
+    ]
+    sections.append('\n'.join([
+        '# HELP cache_hit_ratio Share of cache lookups that were hits',
+        '# TYPE cache_hit_ratio gauge',
+    ] + ratios))
+    return '\n'.join(sections) + '\n'
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+requests_total = Counter(
+    'http_requests_total',
+    'HTTP requests served, by DRF viewset and action',
+    ('view', 'method', 'status')
+)
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling a request',
+    ('view',),
+    LATENCY_BUCKETS
+)
+db_queries = Histogram(
+    'db_queries_per_request',
+    'Number of DB queries run by a request',
+    ('view',),
+    (0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+db_duration = Histogram(
+    'db_query_duration_seconds',
+    'Time spent in DB queries by a request',
+    ('view',),
+    LATENCY_BUCKETS
+)
+cache_requests = Counter(
+    'cache_requests_total',
+    'Cache lookups, by cache and hit or miss',
+    ('cache', 'result')
+)
+upload_bytes = Counter(
+    'image_upload_bytes_total',
+    'Bytes of images uploaded',
+    ('view',)
+)
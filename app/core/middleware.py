@@ -0,0 +1,228 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db import connections
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import patch_vary_headers
+
+from core import compression, instrumentation, metrics, views
+
+
+performance_logger = logging.getLogger('core.performance')
+
+
+def is_stateless_request(request):
+    """Return True if the request targets a token authenticated URL prefix"""
+    return request.path_info.startswith(settings.STATELESS_URL_PREFIXES)
+
+
+class HealthCheckMiddleware:
+    """Answer health probes before the rest of the middleware stack runs
+
+    Must be the first entry in MIDDLEWARE: probes skip host validation,
+    SSL redirects, sessions, CSRF and URL resolution entirely.
+    """
+    probes = {
+        '/healthz': views.healthz,
+        '/readyz': views.readyz,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        probe = self.probes.get(request.path_info.rstrip('/'))
+        if probe is not None:
+            return probe(request)
+
+        return self.get_response(request)
+
+
+class BrowserOnlyMixin:
+    """Skip a middleware for requests under STATELESS_URL_PREFIXES
+
+    The API authenticates with tokens, so sessions, CSRF cookies, flash
+    messages and frame options only matter to the admin and other browser
+    pages. API requests are handed straight to the next middleware.
+    """
+
+    def __call__(self, request):
+        if is_stateless_request(request):
+            return self.get_response(request)
+
+        return super().__call__(request)
+
+
+# subclasses keep Django's admin system checks (admin.E408 etc.) happy
+class BrowserSessionMiddleware(BrowserOnlyMixin, SessionMiddleware):
+    pass
+
+
+class BrowserCsrfViewMiddleware(BrowserOnlyMixin, CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # process_view is called by the handler directly, not via __call__
+        if is_stateless_request(request):
+            return None
+
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs
+        )
+
+
+class BrowserAuthenticationMiddleware(BrowserOnlyMixin,
+                                      AuthenticationMiddleware):
+    pass
+
+
+class BrowserMessageMiddleware(BrowserOnlyMixin, MessageMiddleware):
+    pass
+
+
+class BrowserXFrameOptionsMiddleware(BrowserOnlyMixin,
+                                     XFrameOptionsMiddleware):
+    pass
+
+
+class PerformanceMiddleware:
+    """Record DB query count and time, serializer time and total time
+
+    The numbers are sent back in a Server-Timing header, logged to the
+    core.performance logger and requests issuing more than
+    PERFORMANCE_QUERY_COUNT_THRESHOLD queries are flagged as possible N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = instrumentation.start_request()
+        # later middleware (metrics export) read the numbers from here
+        request.performance = metrics
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish_request()
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        self.log(request, response, metrics)
+        return response
+
+    def log(self, request, response, metrics):
+        """Write a structured log record for the request"""
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'serialize_ms': round(metrics.serializer_time * 1000, 2),
+            'total_ms': round(metrics.total_time * 1000, 2),
+        }
+        threshold = settings.PERFORMANCE_QUERY_COUNT_THRESHOLD
+        if threshold is not None and metrics.queries > threshold:
+            performance_logger.warning(
+                'Possible N+1: %(method)s %(path)s ran %(queries)d queries',
+                record, extra={'performance': record}
+            )
+        else:
+            performance_logger.info(
+                '%(method)s %(path)s %(status)d queries=%(queries)d '
+                'db=%(db_ms).2fms serialize=%(serialize_ms).2fms '
+                'total=%(total_ms).2fms',
+                record, extra={'performance': record}
+            )
+
+
+def view_label(view_func, method):
+    """Return a metrics label such as RecipeViewSet.upload_image"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    # viewsets map HTTP methods to actions, plain API views use the method
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """Count requests and record latency and DB histograms per view
+
+    Place right after PerformanceMiddleware, whose query count and DB time
+    for the request are reused here.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = getattr(request, 'metrics_view', 'unresolved')
+        metrics.requests_total.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        metrics.request_duration.observe(duration, view=view)
+        performance = getattr(request, 'performance', None)
+        if performance is not None:
+            metrics.db_queries.observe(performance.queries, view=view)
+            metrics.db_duration.observe(performance.db_time, view=view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_label(view_func, request.method)
+
+
+class CompressionMiddleware:
+    """Compress API responses with brotli or gzip, as the client accepts
+
+    Only responses under COMPRESSION_URL_PREFIXES and at least
+    COMPRESSION_MIN_SIZE bytes long are compressed: below that the
+    headers outweigh the saving.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path_info.startswith(
+                settings.COMPRESSION_URL_PREFIXES):
+            return response
+        # the response differs by Accept-Encoding even when not compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+
+        encoding = compression.choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compressed = compression.compress(encoding, response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # the bytes changed: a strong ETag must become weak (our API only
+        # sends weak ones, ETags set elsewhere may not be)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
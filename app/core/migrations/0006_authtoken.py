@@ -0,0 +1,43 @@
+# Generated by Django 3.0.14 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_tokens(apps, schema_editor):
+    """Carry existing rest_framework tokens over, with a fresh lifetime"""
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('core', 'AuthToken')
+    now = django.utils.timezone.now()
+    batch = []
+    for token in Token.objects.iterator():
+        batch.append(AuthToken(
+            key=token.key, user_id=token.user_id, created=now, last_used=now
+        ))
+        if len(batch) == 1000:
+            AuthToken.objects.bulk_create(batch)
+            batch = []
+    AuthToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0002_auto_20160226_1747'),
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
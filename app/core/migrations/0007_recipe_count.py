@@ -0,0 +1,41 @@
+# Generated by Django 3.0.14 on 2026-10-19 11:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Fill recipe_count from the existing links, one UPDATE per model"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', name)
+        through = getattr(Recipe, field).through
+        column = name.lower()
+        counts = through.objects.filter(**{column: OuterRef('pk')}).values(
+            column
+        ).annotate(count=Count('*')).values('count')
+        model.objects.update(
+            recipe_count=Coalesce(Subquery(counts), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_authtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.0.14 on 2026-10-19 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishedRecipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('snapshot', models.TextField()),
+                ('snapshot_version', models.DateTimeField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='published', to='core.Recipe')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.0.14 on 2026-10-19 16:06
+
+from collections import defaultdict
+
+from django.db import migrations, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 1000
+
+
+def map_catalog(apps, schema_editor):
+    """Point existing tags/ingredients to catalog entries, in batches
+
+    Each batch is its own transaction: the tables aren't locked for the
+    whole migration and an interrupted run resumes where it stopped.
+    """
+    for name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', name)
+        catalog = apps.get_model('core', f'Catalog{name}')
+        last_pk = 0
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=last_pk, canonical__isnull=True)
+                .order_by('pk').values_list('pk', 'name')[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            # {catalog name: pks}, same normalization as core/catalog.py
+            pks = defaultdict(list)
+            for pk, row_name in rows:
+                pks[' '.join(row_name.split()).lower()].append(pk)
+            with transaction.atomic():
+                catalog.objects.bulk_create(
+                    [catalog(name=key) for key in pks], ignore_conflicts=True
+                )
+                entries = catalog.objects.filter(name__in=pks)
+                for entry_pk, key in entries.values_list('pk', 'name'):
+                    model.objects.filter(pk__in=pks[key]).update(
+                        canonical_id=entry_pk
+                    )
+
+        # one UPDATE once every row points to its entry
+        users = model.objects.filter(canonical=OuterRef('pk')).values(
+            'canonical'
+        ).annotate(count=Count('*')).values('count')
+        catalog.objects.update(user_count=Coalesce(Subquery(users), Value(0)))
+
+
+class Migration(migrations.Migration):
+    # batches commit on their own
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_catalog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.14 on 2026-10-19 18:10
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_distinct_users(apps, schema_editor):
+    """Recount user_count as distinct users, 0012 counted rows
+
+    Users being deleted (deleted_at set) were already taken out.
+    """
+    for name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', name)
+        catalog = apps.get_model('core', f'Catalog{name}')
+        users = model.objects.filter(
+            canonical=OuterRef('pk'), user__deleted_at__isnull=True
+        ).order_by().values('canonical').annotate(
+            count=Count('user', distinct=True)
+        ).values('count')
+        catalog.objects.update(user_count=Coalesce(Subquery(users), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_distinct_users, migrations.RunPython.noop),
+    ]
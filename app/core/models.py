@@ -1,6 +1,10 @@
 import uuid
 import os
+import secrets
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 # imports required from django to customize use rmodel
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
@@ -54,6 +58,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # set when the account is deleted, purge_deleted removes it and its
+    # data later (see core/deletion.py)
+    deleted_at = models.DateTimeField(null=True, blank=True)
 
     # creating an object using UserManager class instance
     objects = UserManager()
@@ -61,6 +68,79 @@ class User(AbstractBaseUser, PermissionsMixin):
     # Set email as the USERNAME_FIELD
     USERNAME_FIELD = 'email'
 
+    class Meta:
+        # only the few deleted users are indexed, for purge_deleted
+        indexes = [models.Index(
+            fields=['deleted_at'],
+            condition=models.Q(deleted_at__isnull=False),
+            name='user_deleted_at_idx'
+        )]
+
+
+class AuthTokenQuerySet(models.QuerySet):
+
+    def expired(self, now=None):
+        """Return tokens past their lifetime or idle for too long"""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(created__lt=now - timedelta(seconds=settings.TOKEN_TTL)) |
+            models.Q(
+                last_used__lt=now - timedelta(seconds=settings.TOKEN_IDLE_TTL)
+            )
+        )
+
+
+class AuthToken(models.Model):
+    """Expiring API token, a user gets a new one on every login"""
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='auth_tokens',
+        on_delete=models.CASCADE
+    )
+    # indexed for the expired token cleanup
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = AuthTokenQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            # same format as rest_framework.authtoken keys
+            self.key = secrets.token_hex(20)
+        return super().save(*args, **kwargs)
+
+    def is_expired(self, now=None):
+        """Return True if the token is past its lifetime or idle timeout"""
+        now = now or timezone.now()
+        return (
+            now - self.created > timedelta(seconds=settings.TOKEN_TTL) or
+            now - self.last_used > timedelta(seconds=settings.TOKEN_IDLE_TTL)
+        )
+
+    def __str__(self):
+        return self.key
+
+
+class CatalogTag(models.Model):
+    """Tag name shared by all users, see core/catalog.py"""
+    # normalized: 'Vegan', ' vegan' and 'VEGAN' are one entry
+    name = models.CharField(max_length=255, unique=True)
+    # number of user tags pointing to the entry, kept up to date by signals
+    user_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogIngredient(models.Model):
+    """Ingredient name shared by all users, see core/catalog.py"""
+    name = models.CharField(max_length=255, unique=True)
+    user_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return self.name
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
@@ -70,6 +150,15 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )  # CASCADE means on deleting user, delete the tag as well
+    # shared catalog entry of the name, set on save by core/signals.py
+    canonical = models.ForeignKey(
+        CatalogTag,
+        null=True,
+        on_delete=models.PROTECT,
+        related_name='tags'
+    )
+    # number of recipes using the tag, kept up to date by core/signals.py
+    recipe_count = models.PositiveIntegerField(default=0, db_index=True)
 
     # string representation of Tag model on admin
     def __str__(self):
@@ -83,12 +172,27 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    canonical = models.ForeignKey(
+        CatalogIngredient,
+        null=True,
+        on_delete=models.PROTECT,
+        related_name='ingredients'
+    )
+    # number of recipes using the ingredient, kept up to date by signals
+    recipe_count = models.PositiveIntegerField(default=0, db_index=True)
 
     # string representation of Ingredient model on admin
     def __str__(self):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    """Recipes that aren't soft deleted"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     """Recipe object"""
     user = models.ForeignKey(
@@ -105,7 +209,96 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     # don't call fn, send a reference which will be called by django
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # last change, including tags/ingredients changes (core/signals.py).
+    # Used for ETag/Last-Modified headers
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # set when the recipe is deleted, it is hidden at once and removed with
+    # its links and image by purge_deleted (see core/deletion.py)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # first manager is the default one: deleted recipes are left out of
+    # every query, including tag.recipe_set
+    objects = RecipeManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [models.Index(
+            fields=['deleted_at'],
+            condition=models.Q(deleted_at__isnull=False),
+            name='recipe_deleted_at_idx'
+        )]
 
     # string representation of Recipe model on admin
     def __str__(self):
         return self.title
+
+
+def shared_recipe_slug(recipe_id):
+    """Return a new unguessable slug for a recipe's public link"""
+    # starts with the recipe id: the cached snapshot is found (and dropped
+    # on edits) by recipe id without a query
+    return f'{recipe_id}-{secrets.token_urlsafe(12)}'
+
+
+class PublishedRecipe(models.Model):
+    """Read-only public link to a recipe, with a snapshot of its data"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='published'
+    )
+    slug = models.SlugField(max_length=50, unique=True)
+    # rendered JSON of the recipe, sent as is by the public endpoint
+    snapshot = models.TextField()
+    # Recipe.updated_at the snapshot was taken at, older means stale
+    snapshot_version = models.DateTimeField()
+    created = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.slug
+
+
+class ChangeLogQuerySet(models.QuerySet):
+
+    def record(self, kind, objects, deleted=False):
+        """Log changes of (pk, user_id) pairs, one INSERT for all of them"""
+        return self.bulk_create([
+            self.model(
+                user_id=user_id, kind=kind, object_id=pk, deleted=deleted
+            )
+            for pk, user_id in objects
+        ])
+
+
+class ChangeLog(models.Model):
+    """A recipe, tag or ingredient of a user was saved or deleted
+
+    The ids increase monotonically: a client that synced up to id N gets
+    the changes since with the entries after N (see recipe/sync.py). They
+    may commit out of order, tokens lag by SYNC_COMMIT_WINDOW.
+    """
+    KINDS = ('recipe', 'tag', 'ingredient')
+
+    id = models.BigAutoField(primary_key=True)
+    # no database constraint: deleting a user deletes its entries, but the
+    # tombstones logged while its objects are being deleted may outlive it
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        # covered by the (user, id) index
+        db_index=False,
+        related_name='+'
+    )
+    kind = models.CharField(
+        max_length=10, choices=[(kind, kind) for kind in KINDS]
+    )
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        # a user's changes after a token: an index range scan
+        indexes = [models.Index(fields=['user', 'id'])]
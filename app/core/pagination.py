@@ -0,0 +1,9 @@
+from django.conf import settings
+
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class CatalogPagination(LimitOffsetPagination):
+    """?limit=&offset= pages, the catalog holds every user's names"""
+    default_limit = settings.CATALOG_PAGE_SIZE
+    max_limit = settings.CATALOG_MAX_PAGE_SIZE
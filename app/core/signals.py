@@ -0,0 +1,231 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from core.catalog import catalog_entries, catalog_model, catalog_name, \
+    change_user_counts, unused_entries
+from core.models import ChangeLog, Tag, Ingredient, Recipe
+
+
+# Tag/Ingredient.recipe_count follow the Recipe.tags/ingredients links.
+# Counters are changed with F() expressions, a single UPDATE computed by
+# the database, so concurrent requests can't overwrite each other's counts.
+# Recipe.updated_at is bumped when its links, or the tags/ingredients it
+# shows, change: its ETag must change with everything the detail renders.
+# Every save, delete and touch is also added to the ChangeLog for the
+# delta sync endpoint (recipe/sync.py). Tags and ingredients point to the
+# catalog entry of their name, whose user_count follows them (core/catalog.py).
+
+# sent with recipe_ids when touch_recipes bumps updated_at with an
+# UPDATE, which sends no post_save
+recipes_touched = Signal()
+# sent with the (pk, user_id) pairs of soft deleted recipes
+# (core/deletion.py): they get no pre/post_delete, purge_deleted removes
+# them without signals
+recipes_deleted = Signal()
+
+COUNTED_RELATIONS = {
+    Recipe.tags.through: Tag,
+    Recipe.ingredients.through: Ingredient,
+}
+
+
+def change_recipe_counts(model, pks, delta):
+    """Add delta to the recipe_count of the model objects with pks"""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        # never below zero, even if a counter drifted
+        queryset = queryset.filter(recipe_count__gte=-delta)
+    queryset.update(recipe_count=F('recipe_count') + delta)
+
+
+def touch_recipes(recipes):
+    """Set updated_at of (pk, user_id) recipes to now and log the change"""
+    Recipe.objects.filter(
+        pk__in=[pk for pk, _ in recipes]
+    ).update(updated_at=timezone.now())
+    ChangeLog.objects.record('recipe', recipes)
+    recipes_touched.send(
+        sender=Recipe, recipe_ids=[pk for pk, _ in recipes]
+    )
+
+
+def recipe_owners(pks):
+    """Return (pk, user_id) pairs of the recipes with pks"""
+    return list(Recipe.objects.filter(pk__in=pks).values_list('pk', 'user'))
+
+
+@receiver(m2m_changed)
+def recipe_links_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """Keep recipe counts and updated_at in step with link changes"""
+    model = COUNTED_RELATIONS.get(sender)
+    if model is None:
+        return
+    column = model._meta.model_name
+
+    if action == 'pre_clear':
+        # links are gone by post_clear, remember what they were
+        links = sender.objects.filter(**{
+            column if reverse else 'recipe': instance,
+        })
+        instance._cleared_recipe_links = list(
+            links.values_list('recipe_id' if reverse else f'{column}_id',
+                              flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_recipe_links', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if not pk_set:
+        return
+
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        # tag.recipe_set.add(*recipes): one tag, len(pk_set) recipes
+        change_recipe_counts(model, [instance.pk], sign * len(pk_set))
+        touch_recipes(recipe_owners(pk_set))
+    else:
+        change_recipe_counts(model, pk_set, sign)
+        # RecipeSerializer saves the recipe with its links, updated_at is
+        # already current then
+        if not getattr(instance, '_updated_at_saved', False):
+            touch_recipes([(instance.pk, instance.user_id)])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def linked_object_changed(sender, instance, created=False, **kwargs):
+    """Bump the recipes showing a renamed or deleted tag/ingredient"""
+    if created:
+        return
+    through = next(
+        through for through, model in COUNTED_RELATIONS.items()
+        if model is sender
+    )
+    touch_recipes(recipe_owners(through.objects.filter(**{
+        sender._meta.model_name: instance,
+    }).values('recipe_id')))
+
+
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def link_catalog_entry(sender, instance, update_fields=None, **kwargs):
+    """Point a tag/ingredient being saved to the catalog entry of its name"""
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    name = catalog_name(instance.name)
+    catalog = catalog_model(sender)
+    cached = sender.canonical.field.get_cached_value(instance, None)
+    if cached is not None and cached.name == name:
+        return
+    entry = catalog_entries(catalog, [name])[name]
+    if entry.pk != instance.canonical_id:
+        # renamed, or new: post_save moves the count
+        instance._previous_canonical_id = instance.canonical_id
+        instance.canonical = entry
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def count_catalog_users(sender, instance, **kwargs):
+    """Move a tag/ingredient's catalog count to its new entry"""
+    if not hasattr(instance, '_previous_canonical_id'):
+        return
+    previous = instance.__dict__.pop('_previous_canonical_id')
+    # the user's other rows may still count them in either entry
+    unused = unused_entries(
+        sender, instance.user_id, [previous, instance.canonical_id],
+        exclude=[instance.pk]
+    )
+    catalog = catalog_model(sender)
+    if previous in unused:
+        change_user_counts(catalog, [previous], -1)
+    if instance.canonical_id in unused:
+        change_user_counts(catalog, [instance.canonical_id], 1)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def forget_catalog_user(sender, instance, **kwargs):
+    change_user_counts(
+        catalog_model(sender),
+        unused_entries(sender, instance.user_id, [instance.canonical_id]),
+        -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def log_change(sender, instance, **kwargs):
+    """Log saved objects, and tombstones for deleted ones"""
+    ChangeLog.objects.record(
+        sender._meta.model_name,
+        [(instance.pk, instance.user_id)],
+        deleted=kwargs['signal'] is post_delete
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, **kwargs):
+    """Decrement the counts of a deleted recipe's tags and ingredients"""
+    if instance.deleted_at is not None:
+        # done when it was soft deleted
+        return
+    # links are removed by the delete cascade, without m2m_changed
+    for through, model in COUNTED_RELATIONS.items():
+        column = model._meta.model_name
+        change_recipe_counts(
+            model,
+            through.objects.filter(recipe=instance)
+            .values(f'{column}_id'),
+            -1
+        )
+
+
+@receiver(recipes_deleted)
+def forget_soft_deleted_recipes(sender, recipes, **kwargs):
+    """Decrement the counts of soft deleted recipes' tags and ingredients,
+    and log their tombstones"""
+    pks = [pk for pk, _ in recipes]
+    for through, model in COUNTED_RELATIONS.items():
+        column = model._meta.model_name
+        # a tag of several deleted recipes goes down by as many
+        by_count = defaultdict(list)
+        links = through.objects.filter(recipe_id__in=pks).values_list(
+            f'{column}_id', flat=True
+        )
+        for pk, count in Counter(links).items():
+            by_count[count].append(pk)
+        for count, linked in by_count.items():
+            change_recipe_counts(model, linked, -count)
+    ChangeLog.objects.record('recipe', recipes, deleted=True)
+
+
+def actual_recipe_count(model):
+    """Return an expression counting the recipes linked to a model row"""
+    through = next(
+        through for through, counted in COUNTED_RELATIONS.items()
+        if counted is model
+    )
+    column = model._meta.model_name
+    counts = through.objects.filter(**{
+        column: OuterRef('pk'),
+        # links of soft deleted recipes aren't counted
+        'recipe__deleted_at__isnull': True,
+    }).values(
+        column
+    ).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts), Value(0))
@@ -0,0 +1,48 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def load_budgets(path):
+    """Load a {endpoint name: max queries} budget file"""
+    with open(path) as budget_file:
+        return json.load(budget_file)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting endpoints stay within their query budget
+
+    Set query_budgets (usually from load_budgets) on the test class.
+    """
+    query_budgets = {}
+    data_sizes = (1, 10, 100)
+
+    def count_queries(self, request):
+        """Return the number of queries run by request()"""
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400, response.content)
+        return len(queries)
+
+    def assertQueryBudget(self, name, make_data, request):
+        """Assert request() stays within budget at every data size
+
+        make_data(size) grows the data to size objects and returns what
+        request needs; query counts must not grow with the data size.
+        """
+        budget = self.query_budgets[name]
+        counts = {}
+        for size in self.data_sizes:
+            data = make_data(size)
+            counts[size] = self.count_queries(lambda: request(data))
+            with self.subTest(endpoint=name, size=size):
+                self.assertLessEqual(
+                    counts[size], budget,
+                    f'{name} ran {counts[size]} queries with {size} objects, '
+                    f'budget is {budget}'
+                )
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'{name} query count grows with data size: {counts}'
+        )
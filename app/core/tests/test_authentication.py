@@ -0,0 +1,188 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+REVOKE_URL = reverse('user:token-revoke')
+
+
+def token_client(token):
+    """Return a client authenticating with token"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+# a single test process: its local memory cache is shared by every request
+@override_settings(TOKEN_CACHE_SECONDS=60)
+class ExpiringTokenTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = token_client(self.token)
+
+    def test_login_creates_token_per_device(self):
+        """Test every login gets its own token"""
+        payload = {'email': 'test@bgwebagency.com', 'password': 'django1234'}
+        first = APIClient().post(TOKEN_URL, payload)
+        second = APIClient().post(TOKEN_URL, payload)
+
+        self.assertNotEqual(first.data['token'], second.data['token'])
+        self.assertEqual(self.user.auth_tokens.count(), 3)
+
+    def test_valid_token(self):
+        """Test a fresh token authenticates"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(TOKEN_TTL=3600)
+    def test_token_expires_after_ttl(self):
+        """Test a token stops working TOKEN_TTL after it was created"""
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            created=timezone.now() - timedelta(hours=2)
+        )
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_IDLE_TTL=3600)
+    def test_token_expires_when_idle(self):
+        """Test a token unused for TOKEN_IDLE_TTL stops working"""
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            last_used=timezone.now() - timedelta(hours=2)
+        )
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_last_used_writes_coalesced(self):
+        """Test last_used is written once per interval, not per request"""
+        last_used = timezone.now() - timedelta(minutes=5)
+        AuthToken.objects.filter(pk=self.token.pk).update(last_used=last_used)
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.client.get(ME_URL)
+
+        updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.last_used, last_used)
+
+    def test_validation_cached(self):
+        """Test a token is looked up once while its validation is cached"""
+        self.client.get(ME_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(TOKEN_CACHE_SECONDS=0)
+    def test_validation_not_cached(self):
+        """Test with caching off every request looks the token up, a token
+        revoked by another worker stops working at once"""
+        self.client.get(ME_URL)
+        AuthToken.objects.filter(pk=self.token.pk).delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected_despite_cache(self):
+        """Test deactivating a user takes effect with a cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_current_token(self):
+        """Test revoking only the token used for the request"""
+        other = AuthToken.objects.create(user=self.user)
+        self.client.get(ME_URL)
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['revoked'], 1)
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertEqual(
+            token_client(other).get(ME_URL).status_code, status.HTTP_200_OK
+        )
+
+    def test_revoke_all_tokens(self):
+        """Test revoking every token of the user at once"""
+        others = [AuthToken.objects.create(user=self.user) for _ in range(3)]
+        token_client(others[0]).get(ME_URL)
+        stranger = AuthToken.objects.create(
+            user=get_user_model().objects.create_user(
+                'other@bgwebagency.com', 'django1234'
+            )
+        )
+
+        res = self.client.post(REVOKE_URL, {'all': True})
+
+        self.assertEqual(res.data['revoked'], 4)
+        self.assertFalse(self.user.auth_tokens.exists())
+        self.assertEqual(
+            token_client(others[0]).get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertTrue(AuthToken.objects.filter(pk=stranger.pk).exists())
+
+
+class ClearExpiredTokensTests(TestCase):
+
+    @override_settings(TOKEN_TTL=3600, TOKEN_IDLE_TTL=600)
+    def test_clear_expired_tokens(self):
+        """Test expired tokens are deleted in batches, others kept"""
+        user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        now = timezone.now()
+        old = now - timedelta(hours=2)
+        for _ in range(3):
+            AuthToken.objects.create(user=user, created=old, last_used=now)
+        for _ in range(2):
+            AuthToken.objects.create(user=user, created=now, last_used=old)
+        fresh = AuthToken.objects.create(user=user)
+
+        out = StringIO()
+        call_command('clear_expired_tokens', batch_size=2, stdout=out)
+
+        self.assertEqual(list(AuthToken.objects.all()), [fresh])
+        self.assertIn('Deleted 5 expired tokens', out.getvalue())
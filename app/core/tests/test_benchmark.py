@@ -0,0 +1,108 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core import benchmark
+from core.models import Tag, Ingredient, Recipe
+
+
+class BenchmarkTests(TestCase):
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = [5, 1, 4, 2, 3]
+
+        self.assertEqual(benchmark.percentile(samples, 50), 3)
+        self.assertEqual(benchmark.percentile(samples, 100), 5)
+        self.assertEqual(benchmark.percentile([], 50), 0.0)
+
+    def test_generate_dataset(self):
+        """Test the generator creates the requested amount of data"""
+        users = benchmark.generate_dataset(
+            users=2, recipes=5, tags=4, ingredients=10, density=0.5
+        )
+
+        self.assertEqual(len(users), 2)
+        user = users[0]
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 5)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=user).count(), 10)
+        recipe = Recipe.objects.filter(user=user).first()
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 5)
+        # 5 recipes with 2 of the 4 tags each
+        self.assertEqual(
+            sum(Tag.objects.filter(user=user).values_list(
+                'recipe_count', flat=True
+            )),
+            10
+        )
+        self.assertTrue(user.check_password('benchmark1234'))
+
+    def test_generate_dataset_reproducible(self):
+        """Test the same seed generates the same data"""
+        first = benchmark.generate_dataset(recipes=3, seed=7)[0]
+        first_prices = list(
+            Recipe.objects.filter(user=first).values_list('price', flat=True)
+        )
+        Recipe.objects.all().delete()
+        first.delete()
+
+        second = benchmark.generate_dataset(recipes=3, seed=7)[0]
+        second_prices = list(
+            Recipe.objects.filter(user=second).values_list('price', flat=True)
+        )
+
+        self.assertEqual(first_prices, second_prices)
+
+    def test_run_api_benchmark_covers_endpoints(self):
+        """Test every endpoint is measured with latency and query counts"""
+        user = benchmark.generate_dataset(recipes=3, tags=3, ingredients=3)[0]
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            results = benchmark.run_api_benchmark(
+                user, 'benchmark1234', iterations=2, warmup=0
+            )
+
+        self.assertIn('recipe-list', results)
+        self.assertIn('user-token', results)
+        self.assertIn('recipe-upload-image', results)
+        self.assertIn('sync-changes', results)
+        self.assertIn('user-delete', results)
+        for result in results.values():
+            self.assertEqual(result['count'], 2)
+            self.assertIn('p95_ms', result)
+            self.assertIn('queries', result)
+
+    def test_compare_results(self):
+        """Test query count growth and latency growth are regressions"""
+        baseline = {
+            'recipe-list': {'p50_ms': 10.0, 'queries': 3},
+            'tag-list': {'p50_ms': 10.0, 'queries': 2},
+        }
+        current = {
+            'recipe-list': {'p50_ms': 10.5, 'queries': 5},
+            'tag-list': {'p50_ms': 20.0, 'queries': 2},
+            'new-endpoint': {'p50_ms': 1.0, 'queries': 1},
+        }
+
+        regressions = benchmark.compare_results(current, baseline, 0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('recipe-list: 3 -> 5 queries', regressions)
+
+    def test_run_payload_benchmark(self):
+        """Test formats and encodings are compared to plain JSON"""
+        user = benchmark.generate_dataset(recipes=20, tags=3, ingredients=3)[0]
+        data = benchmark.recipe_payloads(user)['recipes']
+
+        results = benchmark.run_payload_benchmark(
+            data, iterations=1, warmup=0
+        )
+
+        self.assertEqual(results['json']['saved'], 0)
+        self.assertLess(
+            results['json+gzip-6']['bytes'], results['json']['bytes']
+        )
+        self.assertGreater(results['json+gzip-6']['compress_ms'], 0)
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.deletion import soft_delete_user
+from core.models import CatalogTag, ChangeLog, PublishedRecipe, Tag, \
+    Ingredient, Recipe
+
+
+def purge():
+    with open(os.devnull, 'w') as devnull:
+        call_command('purge_deleted', '--batch-size', '2', stdout=devnull)
+
+
+class DeletionTestMixin:
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_recipe(self, user, title, tags=()):
+        recipe = Recipe.objects.create(
+            user=user, title=title, time_minutes=10, price=5.00
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def delete_recipe(self, recipe):
+        return self.client.delete(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        )
+
+
+class SoftDeleteTests(DeletionTestMixin, TestCase):
+    """Test deleted recipes and users are hidden at once"""
+
+    def test_delete_recipe_hidden(self):
+        """Test a deleted recipe is gone from the API, its counts and its
+        public link, but kept until purged"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = self.make_recipe(self.user, 'Cake', [tag])
+        pie = self.make_recipe(self.user, 'Pie', [tag])
+        PublishedRecipe.objects.create(
+            recipe=recipe, slug='x', snapshot='{}',
+            snapshot_version=recipe.updated_at
+        )
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        res = self.delete_recipe(recipe)
+        tag.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            [r['title'] for r in self.client.get(
+                reverse('recipe:recipe-list')
+            ).data],
+            ['Pie']
+        )
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(list(tag.recipe_set.all()), [pie])
+        self.assertFalse(PublishedRecipe.objects.exists())
+        self.assertTrue(ChangeLog.objects.filter(
+            kind='recipe', object_id=recipe.id, deleted=True
+        ).exists())
+        self.assertTrue(Recipe.all_objects.filter(pk=recipe.id).exists())
+
+    def test_assigned_only_skips_deleted(self):
+        """Test tags only used by deleted recipes aren't assigned"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        self.make_recipe(self.user, 'Pie', [quick])
+        self.delete_recipe(self.make_recipe(self.user, 'Cake', [vegan]))
+
+        res = self.client.get(
+            reverse('recipe:tag-list'), {'assigned_only': 1}
+        )
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Quick'])
+
+    def test_delete_user_leaves_catalog(self):
+        """Test a deleted user's names stop counting in the catalog"""
+        for name in ('Vegan', ' vegan', 'Quick'):
+            Tag.objects.create(user=self.user, name=name)
+        Tag.objects.create(user=self.other, name='Vegan')
+
+        soft_delete_user(self.user)
+
+        self.assertEqual(
+            dict(CatalogTag.objects.values_list('name', 'user_count')),
+            {'vegan': 1, 'quick': 0}
+        )
+
+    def test_delete_user_constant_queries(self):
+        """Test deleting a user doesn't depend on the amount of its data"""
+        for n in range(20):
+            self.make_recipe(self.user, f'Recipe {n}', [
+                Tag.objects.create(user=self.user, name=f'Tag {n}')
+            ])
+        self.make_recipe(self.other, 'Theirs')
+
+        with self.assertNumQueries(8):
+            soft_delete_user(self.user)
+        with self.assertNumQueries(8):
+            soft_delete_user(self.other)
+
+
+class PurgeDeletedTests(DeletionTestMixin, TransactionTestCase):
+    """Test purge_deleted removes what was soft deleted"""
+
+    def test_purge_recipes(self):
+        """Test purged recipes leave with their links and image, without
+        counting them out twice"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        kept = self.make_recipe(self.user, 'Pie', [tag])
+        deleted = [
+            self.make_recipe(self.user, f'Cake {n}', [tag]) for n in range(3)
+        ]
+        deleted[0].image.save('cake.jpg', ContentFile(b'jpeg'))
+        image = deleted[0].image.path
+        for recipe in deleted:
+            self.delete_recipe(recipe)
+
+        purge()
+        tag.refresh_from_db()
+
+        self.assertEqual(list(Recipe.all_objects.all()), [kept])
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertFalse(os.path.exists(image))
+
+    def test_purge_user(self):
+        """Test a deleted user is removed with all its data, others' stay"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.other, name='Vegan')
+        for n in range(3):
+            self.make_recipe(self.user, f'Cake {n}', [vegan])
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {n}')
+        theirs = self.make_recipe(self.other, 'Pie')
+        soft_delete_user(self.user)
+        self.assertEqual(CatalogTag.objects.get(name='vegan').user_count, 1)
+
+        purge()
+
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+        self.assertEqual(list(Recipe.all_objects.all()), [theirs])
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertFalse(Ingredient.objects.filter(user=self.user).exists())
+        self.assertFalse(ChangeLog.objects.filter(user=self.user).exists())
+        self.assertEqual(CatalogTag.objects.get(name='vegan').user_count, 1)
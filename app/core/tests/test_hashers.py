@@ -0,0 +1,139 @@
+import threading
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashers
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+
+TOKEN_URL = reverse('user:token')
+
+PBKDF2_FIRST = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'core.hashers.Argon2PasswordHasher',
+]
+ARGON2_FIRST = list(reversed(PBKDF2_FIRST))
+
+
+def create_user(password='django1234'):
+    return get_user_model().objects.create_user(
+        'test@bgwebagency.com',
+        password
+    )
+
+
+class HasherTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    @override_settings(PASSWORD_HASHERS=PBKDF2_FIRST, PBKDF2_ITERATIONS=1000)
+    def test_cost_from_settings(self):
+        """Test new passwords are hashed with the configured cost"""
+        user = create_user()
+
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('django1234'))
+
+    def test_rehash_on_login_when_cost_raised(self):
+        """Test logging in rehashes a password made with an older cost"""
+        with override_settings(PASSWORD_HASHERS=PBKDF2_FIRST,
+                               PBKDF2_ITERATIONS=1000):
+            user = create_user()
+
+        with override_settings(PASSWORD_HASHERS=PBKDF2_FIRST,
+                               PBKDF2_ITERATIONS=2000):
+            res = self.client.post(TOKEN_URL, {
+                'email': user.email, 'password': 'django1234',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @skipUnless(argon2, 'argon2-cffi is not installed')
+    def test_upgrade_to_argon2_on_login(self):
+        """Test logging in moves a PBKDF2 password to Argon2"""
+        with override_settings(PASSWORD_HASHERS=PBKDF2_FIRST,
+                               PBKDF2_ITERATIONS=1000):
+            user = create_user()
+
+        with override_settings(PASSWORD_HASHERS=ARGON2_FIRST):
+            res = self.client.post(TOKEN_URL, {
+                'email': user.email, 'password': 'django1234',
+            })
+            user.refresh_from_db()
+            self.assertTrue(user.check_password('django1234'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(user.password.startswith('argon2$'))
+
+    @skipUnless(bcrypt, 'bcrypt is not installed')
+    @override_settings(
+        PASSWORD_HASHERS=['core.hashers.BCryptSHA256PasswordHasher'],
+        BCRYPT_ROUNDS=4
+    )
+    def test_bcrypt_hasher(self):
+        """Test PASSWORD_HASHER=bcrypt hashes and checks passwords"""
+        user = create_user()
+
+        self.assertTrue(user.password.startswith('bcrypt_sha256$'))
+        self.assertTrue(user.check_password('django1234'))
+
+    def test_hashing_runs_on_pool(self):
+        """Test hashes are computed on the hashing pool threads"""
+        thread = hashers.offload(threading.current_thread)
+
+        self.assertTrue(thread.name.startswith('password-hashing'))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_BACKLOG=0)
+    def test_pool_full_fails_fast(self):
+        """Test hashing fails fast once workers and backlog are taken"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=hashers.offload, args=(block,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(hashers.PasswordHashingBusy):
+                hashers.offload(lambda: None)
+        finally:
+            release.set()
+            worker.join()
+
+    def test_login_busy_returns_503(self):
+        """Test the token endpoint returns 503 while hashing is saturated"""
+        user = create_user()
+
+        with patch(
+            'core.hashers.HashingPool.run',
+            side_effect=hashers.PasswordHashingBusy
+        ):
+            res = self.client.post(TOKEN_URL, {
+                'email': user.email, 'password': 'django1234',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
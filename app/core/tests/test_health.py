@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from django.test import TestCase, Client, override_settings
+
+from core import views
+
+
+class HealthCheckTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        views.reset_readiness_cache()
+
+    def tearDown(self):
+        views.reset_readiness_cache()
+
+    def test_healthz_ok_without_db(self):
+        """Test liveness probe succeeds without touching the DB"""
+        with self.assertNumQueries(0):
+            res = self.client.get('/healthz')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_healthz_skips_middleware_stack(self):
+        """Test probes are answered before session/CSRF middleware"""
+        res = self.client.get('/healthz', HTTP_HOST='10.0.0.1')
+
+        # an unknown host would be rejected by CommonMiddleware
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('X-Frame-Options', res)
+        self.assertNotIn('sessionid', res.cookies)
+
+    def test_readyz_ok(self):
+        """Test readiness probe reports DB and migrations as ok"""
+        with patch('core.views._migrations_applied', return_value=True):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['checks'], {
+            'database': 'ok',
+            'migrations': 'ok',
+        })
+
+    def test_readyz_result_cached(self):
+        """Test readiness result is reused within the cache window"""
+        with patch('core.views._migrations_applied', return_value=True):
+            self.client.get('/readyz')
+            with self.assertNumQueries(0):
+                res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(READINESS_CACHE_SECONDS=0)
+    def test_readyz_database_unavailable(self):
+        """Test readiness probe fails when the DB can't be reached"""
+        with patch('core.views._database_ready', return_value=False):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['database'], 'unavailable')
+
+    @override_settings(READINESS_CACHE_SECONDS=0)
+    def test_readyz_migrations_pending(self):
+        """Test readiness probe fails while migrations are unapplied"""
+        with patch('core.views._migrations_applied', return_value=False):
+            res = self.client.get('/readyz')
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['checks']['migrations'], 'pending')
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+
+    def test_server_timing_header(self):
+        """Test API responses carry db, serialize and total timings"""
+        res = self.client.get(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_query_count_reported(self):
+        """Test the number of queries run by the view is reported"""
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertIn('desc="3 queries"', res['Server-Timing'])
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """Test the Server-Timing header can be switched off"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(PERFORMANCE_QUERY_COUNT_THRESHOLD=1)
+    def test_query_threshold_flagged(self):
+        """Test requests over the query threshold are logged as N+1"""
+        with self.assertLogs('core.performance', 'WARNING') as logs:
+            self.client.get(RECIPES_URL)
+
+        self.assertIn('Possible N+1', logs.output[0])
+        self.assertEqual(logs.records[0].performance['queries'], 3)
+
+
+class TimedSerializerTests(TestCase):
+
+    def tearDown(self):
+        instrumentation.finish_request()
+
+    def test_nested_serializers_timed_once(self):
+        """Test nested serializer time is not counted twice"""
+        user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+        metrics = instrumentation.start_request()
+
+        RecipeDetailSerializer(recipe).data
+
+        self.assertGreater(metrics.serializer_time, 0)
+        self.assertEqual(metrics.serializer_depth, 0)
+
+    def test_no_request_no_timing(self):
+        """Test serializers work outside of a request"""
+        self.assertIsNone(instrumentation.current_metrics())
+        user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+
+        data = RecipeDetailSerializer(recipe).data
+
+        self.assertEqual(data['title'], recipe.title)
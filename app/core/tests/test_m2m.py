@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.m2m import sync_m2m
+from core.models import Tag, Recipe
+
+
+class SyncM2MTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cake',
+            time_minutes=30,
+            price=5.00
+        )
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {n}')
+            for n in range(4)
+        ]
+        self.recipe.tags.add(self.tags[0], self.tags[1])
+        self.changes = []
+        m2m_changed.connect(self.record, sender=Recipe.tags.through)
+        self.addCleanup(
+            m2m_changed.disconnect, self.record, sender=Recipe.tags.through
+        )
+
+    def record(self, action, pk_set, **kwargs):
+        self.changes.append((action, pk_set))
+
+    def test_sync_writes_diff(self):
+        """Test only added and removed links are written, signals sent"""
+        wanted = [self.tags[1], self.tags[2], self.tags[3]]
+
+        with CaptureQueriesContext(connection) as queries:
+            sync_m2m(self.recipe, 'tags', wanted)
+
+        # current links, one DELETE, one INSERT, and after each of them
+        # the recipe_count and updated_at UPDATEs and a change log INSERT
+        self.assertEqual(len(queries), 9)
+        self.assertEqual(
+            set(Recipe.objects.get(id=self.recipe.id).tags.all()), set(wanted)
+        )
+        removed = {self.tags[0].id}
+        added = {self.tags[2].id, self.tags[3].id}
+        self.assertEqual(self.changes, [
+            ('pre_remove', removed), ('post_remove', removed),
+            ('pre_add', added), ('post_add', added),
+        ])
+
+    def test_sync_unchanged_uses_prefetch(self):
+        """Test nothing is queried or written when links are unchanged"""
+        recipe = Recipe.objects.prefetch_related('tags').get(
+            id=self.recipe.id
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            sync_m2m(recipe, 'tags', [self.tags[1], self.tags[0]])
+            tags = list(recipe.tags.all())
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.changes, [])
+        self.assertEqual(tags, [self.tags[1], self.tags[0]])
@@ -0,0 +1,194 @@
+import tempfile
+import threading
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import AuthToken, Recipe
+
+
+class MetricTypeTests(TestCase):
+
+    def test_counter_exposition(self):
+        """Test counters are exported per label set"""
+        counter = metrics.Counter(
+            'test_total', 'Test counter', ('view',), registry=[]
+        )
+        counter.inc(view='a')
+        counter.inc(2, view='a')
+        counter.inc(view='b')
+
+        text = counter.expose()
+
+        self.assertIn('# TYPE test_total counter', text)
+        self.assertIn('test_total{view="a"} 3', text)
+        self.assertIn('test_total{view="b"} 1', text)
+
+    def test_histogram_buckets_cumulative(self):
+        """Test histogram buckets are cumulative with sum and count"""
+        histogram = metrics.Histogram(
+            'test_seconds', 'Test histogram', buckets=(0.1, 1), registry=[]
+        )
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(5)
+
+        text = histogram.expose()
+
+        self.assertIn('test_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum 5.15', text)
+        self.assertIn('test_seconds_count 3', text)
+
+    def test_counter_thread_safe(self):
+        """Test concurrent increments from many threads are all counted"""
+        counter = metrics.Counter('test_total', 'Test counter', registry=[])
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.values()[()], 8000)
+
+    def test_label_values_escaped(self):
+        """Test quotes in label values don't break the exposition format"""
+        counter = metrics.Counter(
+            'test_total', 'Test counter', ('view',), registry=[]
+        )
+        counter.inc(view='say "hi"')
+
+        self.assertIn(r'test_total{view="say \"hi\""} 1', counter.expose())
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_requests_labeled_by_viewset_action(self):
+        """Test requests are counted per DRF viewset and action"""
+        self.client.get(reverse('recipe:recipe-list'))
+
+        res = Client().get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        text = res.content.decode()
+        self.assertIn(
+            'http_requests_total{view="RecipeViewSet.list",method="GET",'
+            'status="200"} 1',
+            text
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{view="RecipeViewSet.list"}'
+            ' 1',
+            text
+        )
+        self.assertIn(
+            'db_queries_per_request_count{view="RecipeViewSet.list"} 1', text
+        )
+
+    def test_only_allowed_ips_scrape(self):
+        """Test /metrics is refused to clients outside the allowlist"""
+        public = Client(REMOTE_ADDR='203.0.113.5').get('/metrics')
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.0/8', '']):
+            allowed = Client(REMOTE_ADDR='10.1.2.3').get('/metrics')
+            local = Client().get('/metrics')
+
+        self.assertEqual(public.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(local.status_code, 403)
+
+    def test_image_upload_bytes_counted(self):
+        """Test uploaded image bytes are counted for upload_image"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            size = ntf.tell()
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+        recipe.refresh_from_db()
+        recipe.image.delete()
+
+        values = metrics.upload_bytes.values()
+
+        self.assertEqual(values[('RecipeViewSet.upload_image',)], size)
+
+    def test_null_image_not_counted(self):
+        """Test clearing the image with null counts no bytes"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=10,
+            price=5.00
+        )
+
+        res = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': None}, format='json'
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(metrics.upload_bytes.values(), {})
+
+    @override_settings(TOKEN_CACHE_SECONDS=60)
+    def test_app_caches_counted(self):
+        """Test token, summary and shared recipe lookups are counted"""
+        cache.clear()
+        token = AuthToken.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Cake', time_minutes=10, price=5.00
+        )
+        slug = self.client.post(
+            reverse('recipe:recipe-publish', args=[recipe.id])
+        ).data['slug']
+
+        for _ in range(2):
+            client.get(reverse('recipe:recipe-summary'))
+            Client().get(reverse('recipe:shared-recipe', args=[slug]))
+
+        self.assertEqual(metrics.cache_hit_ratios(), {
+            'auth_token': 0.5,
+            'recipe_summary': 0.5,
+            'shared_recipe': 0.5,
+        })
+
+    def test_cache_hit_ratio_exported(self):
+        """Test cache hit ratios are derived from cache lookups"""
+        metrics.cache_requests.inc(cache='readiness', result='hit')
+        metrics.cache_requests.inc(cache='readiness', result='hit')
+        metrics.cache_requests.inc(cache='readiness', result='miss')
+        metrics.cache_requests.inc(cache='readiness', result='hit')
+
+        text = metrics.render()
+
+        self.assertIn('cache_hit_ratio{cache="readiness"} 0.75', text)
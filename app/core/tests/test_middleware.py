@@ -0,0 +1,116 @@
+import gzip
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+
+from core import compression, middleware
+
+
+class BrowserOnlyMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_stack(self, path):
+        """Run a request through the session and auth middleware"""
+        request = self.factory.get(path)
+        stack = middleware.BrowserSessionMiddleware(
+            middleware.BrowserAuthenticationMiddleware(
+                middleware.BrowserMessageMiddleware(
+                    lambda req: HttpResponse()
+                )
+            )
+        )
+        response = stack(request)
+        return request, response
+
+    def test_api_request_skips_session_and_messages(self):
+        """Test API requests get no session, user or message storage"""
+        request, _ = self.run_stack('/api/recipe/recipes/')
+
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertFalse(hasattr(request, 'user'))
+        self.assertFalse(hasattr(request, '_messages'))
+
+    def test_browser_request_keeps_session_and_messages(self):
+        """Test non API requests still run the wrapped middleware"""
+        request, _ = self.run_stack('/admin/')
+
+        self.assertTrue(hasattr(request, 'session'))
+        self.assertTrue(hasattr(request, 'user'))
+        self.assertTrue(hasattr(request, '_messages'))
+
+    def test_api_response_has_no_frame_options(self):
+        """Test clickjacking header is only added to browser pages"""
+        client = Client()
+        api_res = client.get('/api/recipe/recipes/')
+        admin_res = client.get('/admin/login/')
+
+        self.assertNotIn('X-Frame-Options', api_res)
+        self.assertIn('X-Frame-Options', admin_res)
+
+    def test_bench_middleware_command(self):
+        """Test the middleware microbenchmark runs both pipelines"""
+        out = StringIO()
+        call_command('bench_middleware', requests=5, warmup=0, stdout=out)
+
+        self.assertIn('stock', out.getvalue())
+        self.assertIn('stateless', out.getvalue())
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b'{"title": "Cake"}' * 20
+
+    def get(self, path='/api/recipe/recipes/', body=None, **headers):
+        response = HttpResponse(self.body if body is None else body)
+        response['ETag'] = '"abc"'
+        stack = middleware.CompressionMiddleware(lambda request: response)
+        return stack(self.factory.get(path, **headers))
+
+    def test_gzip(self):
+        """Test API responses are gzipped for clients accepting it"""
+        res = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), self.body)
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        # a strong ETag no longer matches the bytes, it must become weak
+        self.assertEqual(res['ETag'], 'W/"abc"')
+
+    @skipUnless(compression.brotli, 'brotli not installed')
+    def test_brotli_preferred(self):
+        """Test brotli is used when accepted along with gzip"""
+        res = self.get(HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(res.content), self.body)
+
+    def test_uncompressed(self):
+        """Test small, non API or unaccepted responses are left alone"""
+        small = self.get(body=b'{}', HTTP_ACCEPT_ENCODING='gzip')
+        admin = self.get('/admin/', HTTP_ACCEPT_ENCODING='gzip')
+        refused = self.get(HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        plain = self.get()
+
+        for res in (small, admin, refused, plain):
+            self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(plain.content, self.body)
+
+    def test_choose_encoding(self):
+        """Test qualities and wildcards of Accept-Encoding"""
+        self.assertEqual(compression.choose_encoding('*'), next(iter(
+            compression.ENCODINGS
+        )))
+        self.assertEqual(
+            compression.choose_encoding('br;q=0, gzip;q=0.5'), 'gzip'
+        )
+        self.assertIsNone(compression.choose_encoding('deflate'))
+        self.assertIsNone(compression.choose_encoding(''))
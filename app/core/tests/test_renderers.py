@@ -0,0 +1,65 @@
+import datetime
+import json
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONParser, ORJSONRenderer, orjson
+
+
+@skipUnless(orjson, 'orjson not installed')
+class ORJSONTests(SimpleTestCase):
+
+    def test_render_matches_json_renderer(self):
+        """Test orjson output matches DRF's JSONRenderer but for decimals"""
+        data = {
+            'price': Decimal('5.10'),
+            'created': datetime.datetime(
+                2020, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc
+            ),
+            'day': datetime.date(2020, 1, 2),
+            'label': gettext_lazy('Recipe'),
+            'tags': [1, 2],
+            1: 'non string key',
+        }
+
+        content = json.loads(ORJSONRenderer().render(data))
+        expected = json.loads(JSONRenderer().render(data))
+
+        # decimals keep their precision, like DecimalField output
+        self.assertEqual(content.pop('price'), '5.10')
+        self.assertEqual(expected.pop('price'), 5.1)
+        self.assertEqual(content, expected)
+
+    def test_render_indent(self):
+        """Test indented output is sent when asked for"""
+        content = ORJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=4'
+        )
+
+        self.assertEqual(content, b'{\n  "id": 1\n}')
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parse(self):
+        parser = ORJSONParser()
+
+        self.assertEqual(
+            parser.parse(BytesIO(b'{"price": "5.10", "tags": [1]}')),
+            {'price': '5.10', 'tags': [1]}
+        )
+        self.assertEqual(
+            parser.parse(
+                BytesIO('{"name": "Crème"}'.encode('latin-1')),
+                parser_context={'encoding': 'latin-1'}
+            ),
+            {'name': 'Crème'}
+        )
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"price": NaN}'))
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class RecipeCountTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+
+    def make_recipe(self, title='Cake'):
+        return Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=30,
+            price=5.00
+        )
+
+    def assertCounts(self, tag_count, ingredient_count):
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, tag_count)
+        self.assertEqual(self.ingredient.recipe_count, ingredient_count)
+
+    def test_add_and_remove(self):
+        """Test counts follow links being added and removed"""
+        recipes = [self.make_recipe(), self.make_recipe()]
+        for recipe in recipes:
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+        self.assertCounts(2, 2)
+
+        recipes[0].tags.remove(self.tag)
+        recipes[1].ingredients.clear()
+
+        self.assertCounts(1, 1)
+
+    def test_reverse_add_and_clear(self):
+        """Test counts follow changes made from the tag side"""
+        self.tag.recipe_set.add(self.make_recipe(), self.make_recipe())
+        self.assertCounts(2, 0)
+
+        self.tag.recipe_set.clear()
+
+        self.assertCounts(0, 0)
+
+    def test_recipe_delete(self):
+        """Test deleting a recipe decrements its tags and ingredients"""
+        recipe = self.make_recipe()
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+        self.make_recipe().tags.add(self.tag)
+
+        recipe.delete()
+
+        self.assertCounts(1, 0)
+
+    def test_count_never_negative(self):
+        """Test a drifted count stays at zero instead of going negative"""
+        recipe = self.make_recipe()
+        recipe.tags.add(self.tag)
+        Tag.objects.update(recipe_count=0)
+
+        recipe.tags.remove(self.tag)
+
+        self.assertCounts(0, 0)
+
+    def test_api_write_and_ordering(self):
+        """Test counts are updated by the API and can be sorted on"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name='Unused')
+        client.post(reverse('recipe:recipe-list'), {
+            'title': 'Curry',
+            'time_minutes': 20,
+            'price': '7.00',
+            'tags': [self.tag.id],
+            'tag_names': ['Dinner'],
+        }, format='json')
+
+        res = client.get(TAGS_URL, {'ordering': '-recipe_count,name'})
+
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Dinner', 1), ('Vegan', 1), ('Unused', 0)]
+        )
+
+    def test_reconcile_recipe_counts(self):
+        """Test the reconcile command repairs drifted counts"""
+        recipe = self.make_recipe()
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.ingredient)
+        Tag.objects.update(recipe_count=7)
+        Ingredient.objects.update(recipe_count=0)
+
+        out = StringIO()
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        self.assertCounts(1, 1)
+        self.assertIn('tags: 1 counts repaired', out.getvalue())
@@ -0,0 +1,227 @@
+import base64
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import throttling
+
+
+TOKEN_URL = reverse('user:token')
+CREATE_USER_URL = reverse('user:create')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def rates(**scopes):
+    """Return REST_FRAMEWORK settings with the given throttle rates"""
+    return {'DEFAULT_THROTTLE_RATES': scopes}
+
+
+class TokenBucketTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_throttled(self):
+        """Test a bucket allows capacity requests then throttles"""
+        results = [
+            throttling.consume('test', 3, 1, now=100) for _ in range(4)
+        ]
+
+        self.assertEqual(
+            [allowed for allowed, _, _ in results],
+            [True, True, True, False]
+        )
+        self.assertEqual(results[2][1], 0)
+        self.assertAlmostEqual(results[3][2], 1)
+
+    def test_bucket_refills(self):
+        """Test tokens come back at the refill rate"""
+        for _ in range(3):
+            throttling.consume('test', 3, 1, now=100)
+
+        allowed, remaining, _ = throttling.consume('test', 3, 1, now=102)
+
+        self.assertTrue(allowed)
+        self.assertEqual(remaining, 1)
+
+    def test_cache_down_falls_back_to_local_store(self):
+        """Test buckets are kept in process while the cache fails"""
+        with patch.object(cache, 'get', side_effect=ConnectionError), \
+                patch.object(cache, 'set', side_effect=ConnectionError):
+            results = [
+                throttling.consume('down', 1, 1, now=100)[0]
+                for _ in range(2)
+            ]
+
+        self.assertEqual(results, [True, False])
+
+
+class AuthThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='10/min',
+                                            auth_email='2/min'))
+    def test_login_throttled_per_email(self):
+        """Test repeated logins for one email are throttled"""
+        payload = {'email': 'test@bgwebagency.com', 'password': 'wrong'}
+        responses = [self.client.post(TOKEN_URL, payload) for _ in range(3)]
+
+        self.assertEqual(responses[0]['X-RateLimit-Limit'], '2')
+        self.assertEqual(responses[0]['X-RateLimit-Remaining'], '1')
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn('Retry-After', responses[2])
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='10/min',
+                                            auth_email='2/min'))
+    def test_email_throttle_ignores_case(self):
+        """Test the email bucket can't be dodged by changing case"""
+        for email in ('test@bgwebagency.com', 'TEST@bgwebagency.com'):
+            self.client.post(TOKEN_URL, {'email': email, 'password': 'x'})
+
+        res = self.client.post(TOKEN_URL, {
+            'email': 'Test@BGWEBAGENCY.com', 'password': 'x'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='2/min',
+                                            auth_email='10/min'))
+    def test_signup_throttled_per_ip(self):
+        """Test signups with different emails share the IP bucket"""
+        responses = [
+            self.client.post(CREATE_USER_URL, {
+                'email': f'user{n}@bgwebagency.com',
+                'password': 'django1234',
+                'name': 'Test',
+            })
+            for n in range(3)
+        ]
+
+        self.assertEqual(responses[1].status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    def signup(self, n, **headers):
+        return self.client.post(CREATE_USER_URL, {
+            'email': f'user{n}@bgwebagency.com',
+            'password': 'django1234',
+            'name': 'Test',
+        }, **headers)
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='2/min',
+                                            auth_email='10/min'))
+    def test_spoofed_forwarded_for_ignored(self):
+        """Test a client can't get new IP buckets by faking the header"""
+        responses = [
+            self.signup(n, HTTP_X_FORWARDED_FOR=f'10.0.0.{n}')
+            for n in range(3)
+        ]
+
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    @override_settings(REST_FRAMEWORK=dict(
+        rates(auth_ip='2/min', auth_email='10/min'), NUM_PROXIES=1
+    ))
+    def test_forwarded_for_behind_proxy(self):
+        """Test behind a proxy, the hop it appended is the client"""
+        responses = [
+            self.signup(n, HTTP_X_FORWARDED_FOR=f'10.0.0.{n}, 1.2.3.4')
+            for n in range(3)
+        ]
+        other = self.signup(3, HTTP_X_FORWARDED_FOR='5.6.7.8')
+
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='10/min',
+                                            auth_email='2/min'))
+    def test_login_body_not_an_object(self):
+        """Test a JSON body that isn't an object is a 400, still counted"""
+        responses = [
+            self.client.post(TOKEN_URL, [], format='json') for _ in range(3)
+        ]
+
+        self.assertEqual(
+            responses[0].status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            responses[2].status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+    @override_settings(REST_FRAMEWORK=rates(auth_ip='2/min',
+                                            auth_email='10/min'))
+    def test_basic_auth_header_throttled(self):
+        """Test a Basic header isn't checked before the throttles, whether
+        its password is right or wrong"""
+        responses = [
+            self.client.post(TOKEN_URL, {}, HTTP_AUTHORIZATION='Basic ' + (
+                base64.b64encode(f'test@bgwebagency.com:{password}'.encode())
+                .decode()
+            ))
+            for password in ('wrong', 'django1234', 'wrong')
+        ]
+
+        self.assertEqual(
+            [res.status_code for res in responses],
+            [status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST,
+             status.HTTP_429_TOO_MANY_REQUESTS]
+        )
+
+    @override_settings(REST_FRAMEWORK=rates())
+    def test_missing_rate_disables_throttle(self):
+        """Test a scope without a rate is not throttled"""
+        payload = {'email': 'test@bgwebagency.com', 'password': 'wrong'}
+        responses = [self.client.post(TOKEN_URL, payload) for _ in range(5)]
+
+        self.assertNotIn(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            [res.status_code for res in responses]
+        )
+        self.assertNotIn('X-RateLimit-Limit', responses[0])
+
+
+class RecipeWriteThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK=rates(user_write='1/min'))
+    def test_writes_throttled_reads_not(self):
+        """Test recipe writes are throttled per user, reads are not"""
+        payload = {'title': 'Cake', 'time_minutes': 30, 'price': '5.00'}
+        first = self.client.post(RECIPES_URL, payload)
+        second = self.client.post(RECIPES_URL, payload)
+        read = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first['X-RateLimit-Remaining'], '0')
+        self.assertEqual(
+            second.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(read.status_code, status.HTTP_200_OK)
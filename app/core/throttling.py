@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class LocalBucketStore:
+    """In-process bucket states, used while the shared cache is down"""
+    max_entries = 10000
+
+    def __init__(self):
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._states.get(key)
+
+    def set(self, key, state, timeout):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            # forget the least recently used buckets, a full bucket and a
+            # missing one behave the same
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+
+local_store = LocalBucketStore()
+
+
+def consume(key, capacity, refill_rate, now=None):
+    """Take one token from a bucket and return (allowed, remaining, wait)
+
+    The bucket holds up to capacity tokens and regains refill_rate tokens
+    per second. Its state is a single (tokens, timestamp) cache entry, so a
+    check costs one cache read and one write whatever the rate. Concurrent
+    checks from different processes may both pass on the last token; a
+    limiter erring by a request under races is acceptable here.
+    """
+    now = time.time() if now is None else now
+    cache = caches[settings.THROTTLE_CACHE]
+    store = cache
+    try:
+        state = cache.get(key)
+    except Exception:
+        # shared cache unreachable: throttle per process rather than not
+        store = local_store
+        state = store.get(key)
+
+    tokens, updated = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    wait = 0 if allowed else (1 - tokens) / refill_rate
+
+    # an untouched bucket refills completely within this many seconds
+    timeout = int(capacity / refill_rate) + 1
+    try:
+        store.set(key, (tokens, now), timeout)
+    except Exception:
+        local_store.set(key, (tokens, now), timeout)
+    return allowed, int(tokens), wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket throttle with its rate in DEFAULT_THROTTLE_RATES
+
+    A rate of '10/min' allows bursts of 10 requests, refilled at 10 per
+    minute. Subclasses set scope and return the bucket key from
+    get_cache_key, or None to skip throttling the request.
+    """
+    scope = None
+
+    def get_rate(self):
+        """Return (capacity, refill per second) or None if disabled"""
+        # read on every request so override_settings works in tests
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return None
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), int(num) / duration
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        capacity, refill_rate = rate
+        allowed, remaining, self.wait_time = consume(
+            f'throttle:{self.scope}:{key}', capacity, refill_rate
+        )
+        # RateLimitHeadersMixin reports the most restrictive bucket
+        current = getattr(request, 'rate_limit', None)
+        if current is None or remaining < current[1]:
+            request.rate_limit = (capacity, remaining)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+def client_ip(request):
+    """Return the client address, only trusting X-Forwarded-For hops
+    appended by our own proxies
+
+    Clients can send any X-Forwarded-For: without NUM_PROXIES (the number
+    of proxies in front of the app) the socket's address is used.
+    """
+    if not api_settings.NUM_PROXIES:
+        return request.META.get('REMOTE_ADDR')
+    # the hop the outermost of our proxies appended
+    return BaseThrottle().get_ident(request)
+
+
+class AuthIPRateThrottle(TokenBucketThrottle):
+    """Limit login and signup attempts per client IP address"""
+    scope = 'auth_ip'
+
+    def get_cache_key(self, request, view):
+        return client_ip(request)
+
+
+class AuthEmailRateThrottle(TokenBucketThrottle):
+    """Limit login and signup attempts per email address, whatever the IP"""
+    scope = 'auth_email'
+
+    def get_cache_key(self, request, view):
+        # a body that isn't an object ([], "x") is left to the serializer's
+        # 400, still counted against the client's address
+        if not isinstance(request.data, Mapping):
+            return f'ip:{client_ip(request)}'
+        email = request.data.get('email')
+        if not email:
+            return None
+        # hashed: keeps raw addresses out of the cache and keys short
+        return hashlib.sha256(
+            str(email).strip().lower().encode()
+        ).hexdigest()
+
+
+class UserWriteRateThrottle(TokenBucketThrottle):
+    """Limit writes per authenticated user, reads are not throttled"""
+    scope = 'user_write'
+
+    def get_cache_key(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return str(request.user.pk)
+
+
+class RateLimitHeadersMixin:
+    """Add X-RateLimit-Limit/Remaining headers to throttled views"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['X-RateLimit-Limit'] = rate_limit[0]
+            response['X-RateLimit-Remaining'] = rate_limit[1]
+        return response
@@ -0,0 +1,103 @@
+import ipaddress
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+
+from core import metrics
+from core.throttling import client_ip
+
+
+# readiness results are cached per process so that frequent load balancer
+# probes don't turn into a steady stream of DB round trips
+_readiness = {
+    'checked_at': None,
+    'database': False,
+    'migrations': False,
+}
+
+
+def _database_ready():
+    """Return True if the default database answers a trivial query"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception:
+        return False
+    return True
+
+
+def _migrations_applied():
+    """Return True if there are no unapplied migrations"""
+    try:
+        executor = MigrationExecutor(connection)
+        targets = executor.loader.graph.leaf_nodes()
+        return not executor.migration_plan(targets)
+    except Exception:
+        return False
+
+
+def reset_readiness_cache():
+    """Forget the cached readiness result (used by tests)"""
+    _readiness['checked_at'] = None
+    _readiness['database'] = False
+    _readiness['migrations'] = False
+
+
+def healthz(request):
+    """Liveness probe: the process is up and able to serve requests"""
+    # never touches the DB, a slow DB must not get the process restarted
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """Readiness probe: the DB is reachable and fully migrated"""
+    now = time.monotonic()
+    checked_at = _readiness['checked_at']
+    if checked_at is None or \
+            now - checked_at >= settings.READINESS_CACHE_SECONDS:
+        metrics.cache_requests.inc(cache='readiness', result='miss')
+        _readiness['database'] = _database_ready()
+        # loading the migration graph is expensive; once everything has been
+        # applied it stays applied for the lifetime of the process
+        if _readiness['database'] and not _readiness['migrations']:
+            _readiness['migrations'] = _migrations_applied()
+        _readiness['checked_at'] = now
+    else:
+        metrics.cache_requests.inc(cache='readiness', result='hit')
+
+    checks = {
+        'database': 'ok' if _readiness['database'] else 'unavailable',
+        'migrations': 'ok' if _readiness['migrations'] else 'pending',
+    }
+    ready = _readiness['database'] and _readiness['migrations']
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': checks},
+        status=200 if ready else 503
+    )
+
+
+def metrics_allowed(request):
+    """Return True if the client may scrape /metrics"""
+    try:
+        address = ipaddress.ip_address(client_ip(request))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_IPS if network.strip()
+    )
+
+
+def metrics_view(request):
+    """Export metrics in the Prometheus text exposition format"""
+    # per view traffic, latency and errors are for the scraper only
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        # connect the summary and shared recipe cache invalidation, and
+        # similarity index update receivers
+        from recipe import sharing, similarity, summary  # noqa: F401
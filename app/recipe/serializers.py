@@ -1,58 +1,263 @@
+from django.conf import settings
+from django.db import transaction
+
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
+from core.catalog import catalog_model, change_user_counts, link_catalog, \
+    unused_entries
+from core.fields import UserOwnedPrimaryKeyRelatedField
+from core.instrumentation import TimedSerializerMixin
+from core.m2m import sync_m2m
+from core.models import CatalogTag, CatalogIngredient, ChangeLog, Tag, \
+    Ingredient, Recipe
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin,
+                    serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count', 'canonical')
+        read_only_fields = ('id', 'recipe_count', 'canonical')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer for Ingredient objects"""
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count', 'canonical')
+        read_only_fields = ('id', 'recipe_count', 'canonical')
+
+
+class CatalogTagSerializer(serializers.ModelSerializer):
+    """Serializer for shared catalog tags"""
+
+    class Meta:
+        model = CatalogTag
+        fields = ('id', 'name', 'user_count')
+        read_only_fields = fields
+
+
+class CatalogIngredientSerializer(serializers.ModelSerializer):
+    """Serializer for shared catalog ingredients"""
+
+    class Meta:
+        model = CatalogIngredient
+        fields = ('id', 'name', 'user_count')
+        read_only_fields = fields
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer a Recipe"""
-    # get all the ingredients primary keys
-    ingredients = serializers.PrimaryKeyRelatedField(
+    # get all the ingredients primary keys, only the user's own are valid
+    # and all of them are fetched in a single query
+    ingredients = UserOwnedPrimaryKeyRelatedField(
         many=True,
+        required=False,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
+        required=False,
         queryset=Tag.objects.all()
     )
+    # names of tags/ingredients to attach, the missing ones are created:
+    # a recipe with new tags and ingredients is a single request. In a
+    # PATCH without the ids they are added to the current ones, otherwise
+    # the ids and names together replace them. Each name may create a row:
+    # at most RECIPE_NAMES_LIMIT of them
+    ingredient_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        write_only=True,
+        max_length=settings.RECIPE_NAMES_LIMIT
+    )
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        write_only=True,
+        max_length=settings.RECIPE_NAMES_LIMIT
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'title', 'ingredients', 'tags', 'time_minutes',
-            'price', 'link'
+            'price', 'link', 'ingredient_names', 'tag_names'
+        )
+        read_only_fields = ('id',)
+
+    # tags and ingredients are written as a diff against the current links,
+    # a bulk INSERT and a DELETE per relation instead of .set() round trips
+    # {relation: (names field, model)}
+    m2m_fields = {
+        'tags': ('tag_names', Tag),
+        'ingredients': ('ingredient_names', Ingredient),
+    }
+
+    def create(self, validated_data):
+        """Create a recipe with its tags and ingredients"""
+        relations = self._pop_relations(validated_data)
+        with transaction.atomic():
+            recipe = super().create(validated_data)
+            self._save_relations(recipe, relations, created=True)
+        return recipe
+
+    def update(self, instance, validated_data):
+        """Update a recipe, writing only changed tags and ingredients"""
+        relations = self._pop_relations(validated_data)
+        # no savepoint in the view's transaction (RecipeViewSet.update),
+        # an error rolls the whole write back anyway
+        with transaction.atomic(savepoint=False):
+            recipe = super().update(instance, validated_data)
+            self._save_relations(recipe, relations)
+        return recipe
+
+    def _save_relations(self, recipe, relations, created=False):
+        """Write the tags/ingredients of a just saved recipe"""
+        # save() bumped updated_at, link changes needn't bump it again
+        recipe._updated_at_saved = True
+        try:
+            for name, objects in self._resolve_names(relations).items():
+                sync_m2m(recipe, name, objects, created=created)
+        finally:
+            del recipe._updated_at_saved
+
+    def _pop_relations(self, validated_data):
+        """Remove the m2m values and names from validated_data
+
+        Returns {relation: (objects, names)}. A relation left out of a
+        PATCH is left alone, left out of a POST or PUT it is emptied.
+        objects is None for a PATCH sending names only: they are added.
+        """
+        relations = {}
+        for name, (names_field, _) in self.m2m_fields.items():
+            objects = validated_data.pop(name, None)
+            names = validated_data.pop(names_field, None)
+            if objects is None and self.partial:
+                if names is None:
+                    continue
+                relations[name] = (None, names)
+            else:
+                relations[name] = (objects or [], names or [])
+        return relations
+
+    def _resolve_names(self, relations):
+        """Return {relation: objects}, adding the objects named"""
+        user = self.context['request'].user
+        resolved = {}
+        for name, (objects, names) in relations.items():
+            model = self.m2m_fields[name][1]
+            if objects is None:
+                # from the prefetch cache when the view prefetched them
+                objects = list(getattr(self.instance, name).all())
+            named = get_or_create_by_names(model, user, names)
+            # dict keyed on pk: an object given by id and name is kept once
+            resolved[name] = list(
+                {obj.pk: obj for obj in objects + named}.values()
+            )
+        return resolved
+
+
+def get_or_create_by_names(model, user, names):
+    """Return the user's model objects named names, creating missing ones
+
+    One query finds the existing objects and one bulk INSERT creates the
+    others, whatever the number of names.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    existing = {}
+    for obj in model.objects.filter(user=user, name__in=names).order_by('id'):
+        # names aren't unique, reuse the oldest object with a name
+        existing.setdefault(obj.name, obj)
+    missing = [name for name in names if name not in existing]
+    if missing:
+        new = [model(user=user, name=name) for name in missing]
+        # bulk_create sends no pre_save/post_save, link and count the
+        # catalog entries here
+        link_catalog(new)
+        # names new to the user may still share an entry with its others
+        change_user_counts(catalog_model(model), unused_entries(
+            model, user.pk, [obj.canonical_id for obj in new]
+        ), 1)
+        created = model.objects.bulk_create(new)
+        if any(obj.pk is None for obj in created):
+            # only some databases (ex: PostgreSQL) return the new ids
+            created = model.objects.filter(user=user, name__in=missing)
+        existing.update((obj.name, obj) for obj in created)
+        # log them for the sync endpoint too
+        ChangeLog.objects.record(
+            model._meta.model_name,
+            [(existing[name].pk, user.pk) for name in missing]
         )
+    return [existing[name] for name in names]
+
+
+class RecipeTagSerializer(TagSerializer):
+    """Serializer for the tags nested in a recipe detail"""
+
+    class Meta(TagSerializer.Meta):
+        # recipe_count changes without the recipe, its ETag wouldn't
+        fields = ('id', 'name')
+        read_only_fields = ('id',)
+
+
+class RecipeIngredientSerializer(IngredientSerializer):
+    """Serializer for the ingredients nested in a recipe detail"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = ('id', 'name')
         read_only_fields = ('id',)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a Recipe detail"""
     # many: True, can have many ingredients. Detail view: ingredient readonly
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientSerializer(many=True, read_only=True)
+    tags = RecipeTagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
 
     class Meta:
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Serializer for the sync endpoint query parameters"""
+    # token of the client's last sync, 0: never synced
+    since = serializers.IntegerField(min_value=0, default=0)
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    """Serializer for the similar recipes query parameters"""
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    metric = serializers.ChoiceField(
+        choices=('jaccard', 'cosine'), default='jaccard'
+    )
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    """Serializer for the cookable recipes query parameters"""
+    # ids of the ingredients at hand, comma separated: '1,2,3'
+    ingredients = serializers.CharField(allow_blank=True)
+    # ingredients a recipe may lack and still be listed
+    missing = serializers.IntegerField(min_value=0, default=0)
+
+    def validate_ingredients(self, value):
+        try:
+            return {int(pk) for pk in value.split(',') if pk.strip()}
+        except ValueError:
+            raise serializers.ValidationError(
+                'Expected comma separated ids.'
+            )
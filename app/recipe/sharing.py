@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core import metrics
+from core.conditional import make_etag
+from core.models import PublishedRecipe, Recipe, shared_recipe_slug
+from core.signals import recipes_deleted, recipes_touched
+
+
+# Public links: a published recipe is served from a snapshot rendered on
+# publish, cached by recipe id. A request for a cached recipe runs no
+# query at all, and CDNs may keep the response for SHARED_RECIPE_S_MAXAGE
+# seconds. Edits drop the cached copy and ask the CDN to purge the
+# recipe's surrogate key; the snapshot itself is re-rendered on the next
+# request, once the edit is committed.
+
+
+class SharedRecipeSerializer(serializers.ModelSerializer):
+    """Public view of a recipe: no ids, no owner"""
+    tags = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field='name'
+    )
+    ingredients = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field='name'
+    )
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'title', 'time_minutes', 'price', 'link', 'image', 'tags',
+            'ingredients',
+        )
+
+
+def cache_key(recipe_id):
+    return f'shared_recipe:{recipe_id}'
+
+
+def surrogate_key(recipe_id):
+    return f'recipe-{recipe_id}'
+
+
+def render_snapshot(recipe):
+    """Render the public JSON of recipe, with the API's own renderer"""
+    prefetch_related_objects([recipe], 'tags', 'ingredients')
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return renderer.render(SharedRecipeSerializer(recipe).data).decode()
+
+
+def publish(recipe):
+    """Return the recipe's PublishedRecipe, creating it if needed"""
+    published = PublishedRecipe.objects.filter(recipe=recipe).first()
+    if published is None:
+        published = PublishedRecipe.objects.create(
+            recipe=recipe,
+            slug=shared_recipe_slug(recipe.pk),
+            snapshot=render_snapshot(recipe),
+            snapshot_version=recipe.updated_at
+        )
+    return published
+
+
+def get_shared(slug):
+    """Return the cached snapshot entry of the recipe shared as slug
+
+    None if no recipe is shared under that slug.
+    """
+    recipe_id, _, _ = slug.partition('-')
+    if not recipe_id.isdigit():
+        return None
+    cache = caches[settings.SHARED_RECIPE_CACHE]
+    entry = cache.get(cache_key(recipe_id))
+    metrics.cache_requests.inc(
+        cache='shared_recipe', result='miss' if entry is None else 'hit'
+    )
+    if entry is None:
+        published = PublishedRecipe.objects.select_related('recipe').filter(
+            recipe_id=recipe_id
+        ).first()
+        if published is None:
+            return None
+        recipe = published.recipe
+        if published.snapshot_version != recipe.updated_at:
+            published.snapshot = render_snapshot(recipe)
+            published.snapshot_version = recipe.updated_at
+            published.save(update_fields=['snapshot', 'snapshot_version'])
+        entry = {
+            'slug': published.slug,
+            'body': published.snapshot.encode(),
+            'etag': make_etag('shared', published.slug, recipe.updated_at),
+            'last_modified': recipe.updated_at,
+        }
+        cache.set(
+            cache_key(recipe_id), entry, settings.SHARED_RECIPE_CACHE_SECONDS
+        )
+    # an unpublished then republished recipe has a new slug
+    if entry['slug'] != slug:
+        return None
+    return entry
+
+
+def purge(recipe_ids):
+    """Ask the CDN to drop its copies of the shared recipes"""
+    if settings.SHARED_RECIPE_PURGE:
+        import_string(settings.SHARED_RECIPE_PURGE)(
+            [surrogate_key(pk) for pk in recipe_ids]
+        )
+
+
+def invalidate(recipe_ids, published=False):
+    """Drop the cached snapshots of recipe_ids, purge them from the CDN
+
+    Unless published is set, only the recipe_ids still published are
+    purged (a query, made only if a purge function is configured).
+    """
+    cache = caches[settings.SHARED_RECIPE_CACHE]
+    keys = [cache_key(pk) for pk in recipe_ids]
+    # cache only, every recipe write pays for this: no query
+    cache.delete_many(keys)
+
+    def committed():
+        # a request between the write and the commit may have cached the
+        # old snapshot
+        cache.delete_many(keys)
+        if settings.SHARED_RECIPE_PURGE and not published:
+            purge(PublishedRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        else:
+            purge(recipe_ids)
+
+    transaction.on_commit(committed)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate([instance.pk])
+
+
+@receiver(recipes_touched)
+def recipes_changed(sender, recipe_ids, **kwargs):
+    invalidate(recipe_ids)
+
+
+# deleted recipes and users' recipes are unpublished at once, their
+# post_delete drops the snapshots
+@receiver(recipes_deleted)
+def recipes_soft_deleted(sender, recipes, **kwargs):
+    PublishedRecipe.objects.filter(
+        recipe_id__in=[pk for pk, _ in recipes]
+    ).delete()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    if instance.deleted_at is not None:
+        PublishedRecipe.objects.filter(recipe__user=instance).delete()
+
+
+# also sent when the recipe is deleted
+@receiver(post_delete, sender=PublishedRecipe)
+def recipe_unpublished(sender, instance, **kwargs):
+    invalidate([instance.recipe_id], published=True)
@@ -0,0 +1,41 @@
+from core.models import Recipe
+
+
+def shopping_list(user, recipe_ids):
+    """Combine the ingredients of the user's recipes with recipe_ids
+
+    Ingredients with the same name (ignoring case) are one line of the
+    list, whatever recipe they come from. Two queries for any number of
+    recipes: their ids, and the ingredient links with the names.
+    """
+    found = set(
+        Recipe.objects.filter(user=user, id__in=recipe_ids)
+        .values_list('id', flat=True)
+    )
+    links = Recipe.ingredients.through.objects.filter(
+        recipe_id__in=found
+    ).order_by('ingredient__name', 'ingredient_id', 'recipe_id').values_list(
+        'ingredient_id', 'ingredient__name', 'recipe_id'
+    )
+
+    # {normalized name: line}, in name order
+    lines = {}
+    for ingredient_id, name, recipe_id in links:
+        line = lines.setdefault(name.strip().lower(), {
+            'name': name,
+            'ingredients': [],
+            'recipes': [],
+        })
+        if ingredient_id not in line['ingredients']:
+            line['ingredients'].append(ingredient_id)
+        if recipe_id not in line['recipes']:
+            line['recipes'].append(recipe_id)
+    for line in lines.values():
+        line['recipe_count'] = len(line['recipes'])
+
+    return {
+        'recipes': [pk for pk in recipe_ids if pk in found],
+        # other users' recipes look the same as ones that don't exist
+        'missing': [pk for pk in recipe_ids if pk not in found],
+        'ingredients': list(lines.values()),
+    }
@@ -0,0 +1,261 @@
+import heapq
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+from core.signals import recipes_deleted
+
+
+# "More like this": recipes are compared by the set of their tags and
+# ingredients. Each worker keeps an in-memory index per user, built once
+# from the link tables and then updated by the m2m signals: a lookup never
+# reads the links again.
+#
+# Other workers change the links too. Every change bumps a version stamp
+# in RECIPE_SIMILARITY_CACHE, an index that missed one is rebuilt. That
+# cache must be shared by the workers (memcached, redis): with a per
+# process one they never see each other's stamps, and only
+# RECIPE_SIMILARITY_MAX_AGE bounds how stale an index gets.
+
+
+def jaccard(common, size, other_size):
+    return common / (size + other_size - common)
+
+
+def cosine(common, size, other_size):
+    return common / math.sqrt(size * other_size)
+
+
+METRICS = {'jaccard': jaccard, 'cosine': cosine}
+
+# {link table: (kind, field of the tag/ingredient in it)}
+RELATIONS = {
+    Recipe.tags.through: ('tag', 'tag_id'),
+    Recipe.ingredients.through: ('ingredient', 'ingredient_id'),
+}
+
+
+class SimilarityIndex:
+    """Tags and ingredients of a user's recipes, with an inverted index
+
+    Features are (kind, id) pairs, ex: ('tag', 3). Only the recipes
+    sharing a feature with the one looked up are scored.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.built = time.monotonic()
+        # changes and lookups of the index, other users' go on meanwhile
+        self.lock = threading.Lock()
+        # {recipe id: features}
+        self.features = defaultdict(set)
+        # {feature: recipe ids}
+        self.postings = defaultdict(set)
+
+    def add(self, recipe_ids, features):
+        for recipe_id in recipe_ids:
+            self.features[recipe_id].update(features)
+        for feature in features:
+            self.postings[feature].update(recipe_ids)
+
+    def remove(self, recipe_ids, features):
+        for recipe_id in recipe_ids:
+            remaining = self.features.get(recipe_id)
+            if remaining is None:
+                continue
+            remaining.difference_update(features)
+            if not remaining:
+                del self.features[recipe_id]
+        for feature in features:
+            recipes = self.postings.get(feature)
+            if recipes is None:
+                continue
+            recipes.difference_update(recipe_ids)
+            if not recipes:
+                del self.postings[feature]
+
+    def remove_recipe(self, recipe_id):
+        self.remove([recipe_id], list(self.features.get(recipe_id, ())))
+
+    def remove_feature(self, feature):
+        self.remove(list(self.postings.get(feature, ())), [feature])
+
+    def similar(self, recipe_id, limit, metric='jaccard'):
+        """Return (score, recipe id) of the limit most similar recipes"""
+        features = self.features.get(recipe_id)
+        if not features:
+            return []
+        # shared features per recipe, from the postings of this one's
+        common = Counter()
+        for feature in features:
+            common.update(self.postings[feature])
+        del common[recipe_id]
+
+        score = METRICS[metric]
+        size = len(features)
+        ranked = heapq.nlargest(limit, (
+            (score(count, size, len(self.features[other])), -other)
+            for other, count in common.items()
+        ))
+        # on equal scores the oldest recipe comes first
+        return [(value, -other) for value, other in ranked]
+
+
+_indexes = OrderedDict()
+# signal receivers and lookups run on different request threads. Only
+# held to read or update _indexes, never while scoring
+_lock = threading.Lock()
+
+
+def version_key(user_id):
+    return f'recipe_similarity:{user_id}'
+
+
+def current_version(user_id):
+    cache = caches[settings.RECIPE_SIMILARITY_CACHE]
+    return cache.get(version_key(user_id), 0)
+
+
+def bump_version(user_id):
+    """Increment the user's version stamp and return it"""
+    cache = caches[settings.RECIPE_SIMILARITY_CACHE]
+    key = version_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted: every worker holding an index now sees a mismatch
+        cache.add(key, 1, None)
+        return cache.get(key, 1)
+
+
+def build_index(user_id, version):
+    """Read the links of the user's recipes, one query per relation"""
+    index = SimilarityIndex(version)
+    for through, (kind, field) in RELATIONS.items():
+        links = through.objects.filter(
+            recipe__user_id=user_id, recipe__deleted_at__isnull=True
+        ).values_list('recipe_id', field)
+        for recipe_id, object_id in links.iterator():
+            index.add([recipe_id], [(kind, object_id)])
+    return index
+
+
+def is_fresh(index, version):
+    return index.version == version and (
+        time.monotonic() - index.built < settings.RECIPE_SIMILARITY_MAX_AGE
+    )
+
+
+def similar_recipes(user_id, recipe_id, limit, metric='jaccard'):
+    """Return (score, recipe id) of the user's recipes most like recipe_id"""
+    version = current_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+
+    if index is None or not is_fresh(index, version):
+        # built without any lock, lookups go on meanwhile
+        index = build_index(user_id, version)
+        with _lock:
+            _indexes[user_id] = index
+            _indexes.move_to_end(user_id)
+            while len(_indexes) > settings.RECIPE_SIMILARITY_INDEXES:
+                _indexes.popitem(last=False)
+    with index.lock:
+        return index.similar(recipe_id, limit, metric)
+
+
+def apply_change(user_id, change):
+    """Apply change(index) to the user's index once the write commits"""
+    def apply():
+        version = bump_version(user_id)
+        with _lock:
+            index = _indexes.get(user_id)
+        if index is None:
+            return
+        with index.lock:
+            if index.version == version - 1:
+                change(index)
+                index.version = version
+                return
+        # another worker changed the links too, start over
+        with _lock:
+            if _indexes.get(user_id) is index:
+                del _indexes[user_id]
+
+    # a rolled back write must not reach the index
+    transaction.on_commit(apply)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    kind, _ = RELATIONS[sender]
+    if reverse:
+        # tag.recipe_set.add(...): pk_set holds recipe ids
+        feature = (kind, instance.pk)
+        recipe_ids = list(pk_set or ())
+        if action == 'post_add':
+            def change(index):
+                index.add(recipe_ids, [feature])
+        elif action == 'post_remove':
+            def change(index):
+                index.remove(recipe_ids, [feature])
+        else:
+            def change(index):
+                index.remove_feature(feature)
+    else:
+        recipe_id = instance.pk
+        features = [(kind, pk) for pk in pk_set or ()]
+        if action == 'post_add':
+            def change(index):
+                index.add([recipe_id], features)
+        elif action == 'post_remove':
+            def change(index):
+                index.remove([recipe_id], features)
+        else:
+            def change(index):
+                index.remove([recipe_id], [
+                    feature for feature in index.features.get(recipe_id, ())
+                    if feature[0] == kind
+                ])
+    apply_change(instance.user_id, change)
+
+
+# deleting a recipe, tag or ingredient deletes its links without any
+# m2m_changed signal
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    apply_change(
+        instance.user_id, lambda index: index.remove_recipe(recipe_id)
+    )
+
+
+@receiver(recipes_deleted)
+def recipes_soft_deleted(sender, recipes, **kwargs):
+    for recipe_id, user_id in recipes:
+        apply_change(
+            user_id,
+            lambda index, recipe_id=recipe_id: index.remove_recipe(recipe_id)
+        )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def feature_deleted(sender, instance, **kwargs):
+    feature = (sender._meta.model_name, instance.pk)
+    apply_change(
+        instance.user_id, lambda index: index.remove_feature(feature)
+    )
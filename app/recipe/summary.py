@@ -0,0 +1,177 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import metrics
+from core.models import Tag, Ingredient, Recipe
+from core.signals import recipes_deleted
+
+
+# Upper bounds of the price distribution buckets, the last bucket holds
+# every recipe priced PRICE_BUCKETS[-1] or more
+PRICE_BUCKETS = (5, 10, 20, 50)
+TOP_COUNT = 5
+
+# The summary is cached in sections, a write only drops the sections it
+# changes: renaming a tag recomputes the tag section, not the recipe
+# aggregates.
+SECTIONS = ('recipes', 'tags', 'ingredients')
+
+
+def cache_key(user_id, section):
+    return f'recipe_summary:{user_id}:{section}'
+
+
+def money(value):
+    return None if value is None else str(Decimal(value).quantize(
+        Decimal('0.01')
+    ))
+
+
+def recipes_section(user):
+    """Recipe totals, time and price statistics in a single query"""
+    bounds = (None,) + PRICE_BUCKETS + (None,)
+    ranges = list(zip(bounds, bounds[1:]))
+    buckets = {}
+    for n, (low, high) in enumerate(ranges):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        buckets[f'bucket_{n}'] = Count('id', filter=condition)
+
+    totals = Recipe.objects.filter(user=user).aggregate(
+        count=Count('id'),
+        time_avg=Avg('time_minutes'),
+        time_min=Min('time_minutes'),
+        time_max=Max('time_minutes'),
+        price_avg=Avg('price'),
+        price_min=Min('price'),
+        price_max=Max('price'),
+        **buckets
+    )
+    return {
+        'recipe_count': totals['count'],
+        'time_minutes': {
+            'avg': (
+                None if totals['time_avg'] is None
+                else round(totals['time_avg'], 1)
+            ),
+            'min': totals['time_min'],
+            'max': totals['time_max'],
+        },
+        'price': {
+            'avg': money(totals['price_avg']),
+            'min': money(totals['price_min']),
+            'max': money(totals['price_max']),
+            'distribution': [
+                {
+                    'min': money(low), 'max': money(high),
+                    'count': totals[f'bucket_{n}'],
+                }
+                for n, (low, high) in enumerate(ranges)
+            ],
+        },
+    }
+
+
+def related_section(model, user):
+    """Count of the user's tags/ingredients and the most used ones"""
+    objects = model.objects.filter(user=user)
+    name = model._meta.verbose_name_plural
+    # recipe_count is denormalized: the top list is an indexed sort,
+    # not a count over every recipe
+    top = objects.filter(recipe_count__gt=0).order_by(
+        '-recipe_count', 'name'
+    ).values('id', 'name', 'recipe_count')[:TOP_COUNT]
+    return {
+        f'{model._meta.model_name}_count': objects.count(),
+        f'top_{name}': list(top),
+    }
+
+
+COMPUTE = {
+    'recipes': recipes_section,
+    'tags': lambda user: related_section(Tag, user),
+    'ingredients': lambda user: related_section(Ingredient, user),
+}
+
+
+def get_summary(user):
+    """Return the user's recipe summary, computing missing sections only"""
+    cache = caches[settings.RECIPE_SUMMARY_CACHE]
+    keys = {section: cache_key(user.pk, section) for section in SECTIONS}
+    cached = cache.get_many(keys.values())
+
+    summary = {}
+    missing = {}
+    for section, key in keys.items():
+        if key not in cached:
+            cached[key] = missing[key] = COMPUTE[section](user)
+        summary.update(cached[key])
+    # one lookup per section
+    metrics.cache_requests.inc(
+        len(keys) - len(missing), cache='recipe_summary', result='hit'
+    )
+    metrics.cache_requests.inc(
+        len(missing), cache='recipe_summary', result='miss'
+    )
+    if missing:
+        cache.set_many(missing, settings.RECIPE_SUMMARY_CACHE_SECONDS)
+    return summary
+
+
+def invalidate(user_id, *sections):
+    """Drop cached summary sections of a user"""
+    cache = caches[settings.RECIPE_SUMMARY_CACHE]
+    keys = [cache_key(user_id, section) for section in sections]
+    cache.delete_many(keys)
+    # again once committed: a read between the write and the commit may
+    # have cached the old values
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    sections = ['recipes']
+    if kwargs.get('signal') is post_delete:
+        # the recipe counts of its tags and ingredients went down
+        sections += ['tags', 'ingredients']
+    invalidate(instance.user_id, *sections)
+
+
+@receiver(recipes_deleted)
+def recipes_soft_deleted(sender, recipes, **kwargs):
+    for user_id in {user_id for _, user_id in recipes}:
+        invalidate(user_id, 'recipes', 'tags', 'ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate(instance.user_id, 'tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate(instance.user_id, 'ingredients')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(instance.user_id, 'tags')
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(instance.user_id, 'ingredients')
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min, prefetch_related_objects
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from core.models import ChangeLog, Tag, Ingredient, Recipe
+
+from recipe.serializers import RecipeSerializer
+
+
+# Delta sync: a client keeps the token of its last sync and asks for what
+# changed after it. The token is a ChangeLog id, the answer is the user's
+# log entries after it: one index range scan on (user, id) instead of
+# comparing every recipe, tag and ingredient.
+#
+# Ids are taken at INSERT time but rows only show once committed: a
+# transaction may commit an id lower than one a client already synced
+# past. Tokens are therefore only handed out for entries older than
+# SYNC_COMMIT_WINDOW seconds, by then the transactions that wrote lower ids
+# are committed or rolled back (requests' transactions last far less).
+
+# {kind: (response key, model)}
+KINDS = {
+    'recipe': ('recipes', Recipe),
+    'tag': ('tags', Tag),
+    'ingredient': ('ingredients', Ingredient),
+}
+
+
+class SyncTagSerializer(serializers.ModelSerializer):
+    """Tag as sent by the sync endpoint"""
+
+    class Meta:
+        model = Tag
+        # recipe_count changes are not logged, clients count themselves
+        fields = ('id', 'name')
+
+
+class SyncIngredientSerializer(serializers.ModelSerializer):
+    """Ingredient as sent by the sync endpoint"""
+
+    class Meta:
+        model = Ingredient
+        fields = ('id', 'name')
+
+
+SERIALIZERS = {
+    'recipe': RecipeSerializer,
+    'tag': SyncTagSerializer,
+    'ingredient': SyncIngredientSerializer,
+}
+
+
+def serialize(kind, objects):
+    if kind == 'recipe':
+        prefetch_related_objects(objects, 'tags', 'ingredients')
+    return SERIALIZERS[kind](objects, many=True).data
+
+
+def empty_response(token, reset=False):
+    response = {'token': token, 'reset': reset, 'more': False}
+    response.update((key, []) for key, _ in KINDS.values())
+    response['deleted'] = {key: [] for key, _ in KINDS.values()}
+    return response
+
+
+def snapshot(user, token, reset=False):
+    """Every object of the user, the client replaces its copy"""
+    response = empty_response(token, reset)
+    for kind, (key, model) in KINDS.items():
+        objects = list(model.objects.filter(user=user).order_by('id'))
+        response[key] = serialize(kind, objects)
+    return response
+
+
+def commit_cutoff():
+    """Return the time before which log entries are safe to sync past"""
+    return timezone.now() - timedelta(seconds=settings.SYNC_COMMIT_WINDOW)
+
+
+def changes(user, since, page_size):
+    """Objects changed and deleted after token since, oldest first"""
+    cutoff = commit_cutoff()
+    entries = list(
+        ChangeLog.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'created')
+        [:page_size + 1]
+    )
+    more = len(entries) > page_size
+    entries = entries[:page_size]
+    # up to the first recent entry, lower ids may still be uncommitted;
+    # the rest is sent on a later sync
+    for index, entry in enumerate(entries):
+        if entry[4] > cutoff:
+            entries = entries[:index]
+            more = False
+            break
+    if not entries:
+        return empty_response(since)
+
+    response = empty_response(entries[-1][0])
+    response['more'] = more
+    # the latest entry of an object decides whether it is sent or deleted
+    latest = {}
+    for _, kind, object_id, deleted, _ in entries:
+        latest[kind, object_id] = deleted
+
+    for kind, (key, model) in KINDS.items():
+        changed = [
+            object_id for (entry_kind, object_id), deleted in latest.items()
+            if entry_kind == kind and not deleted
+        ]
+        deleted = {
+            object_id for (entry_kind, object_id), deleted in latest.items()
+            if entry_kind == kind and deleted
+        }
+        objects = list(
+            model.objects.filter(user=user, id__in=changed).order_by('id')
+        ) if changed else []
+        # deleted after its entry was logged: the tombstone is on a later
+        # page, send it now
+        deleted.update(set(changed) - {obj.id for obj in objects})
+        response[key] = serialize(kind, objects)
+        response['deleted'][key] = sorted(deleted)
+    return response
+
+
+def get_sync(user, since=0):
+    """Return the changes of the user's data after token since
+
+    A client without a token, or with one older than the pruned log, gets
+    a full snapshot with reset set.
+    """
+    page_size = settings.SYNC_PAGE_SIZE
+    if since:
+        bounds = ChangeLog.objects.aggregate(low=Min('id'), high=Max('id'))
+        # an empty log was pruned whole: every token is stale, reset
+        if bounds['high'] is not None:
+            # never handed out: echoing it back would leave the client stuck
+            if since > bounds['high']:
+                raise serializers.ValidationError({'since': 'Unknown token.'})
+            # the entries right after since were pruned, changes would be
+            # lost
+            if since >= bounds['low'] - 1:
+                return changes(user, since, page_size)
+    # the token is read before the objects, and lags by the commit window:
+    # changes made meanwhile, or still uncommitted, are sent again on the
+    # next sync
+    token = ChangeLog.objects.filter(
+        created__lte=commit_cutoff()
+    ).aggregate(high=Max('id'))['high'] or 0
+    return snapshot(user, token, reset=bool(since))
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+
+from recipe.serializers import RecipeDetailSerializer
+
+
+BATCH_URL = reverse('recipe:recipe-batch')
+
+
+def sample_recipe(user, title='Cake'):
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=30,
+        price=5.00
+    )
+
+
+class BatchRecipeApiTests(TestCase):
+    """Test retrieving several recipes in one request"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_batch_in_requested_order(self):
+        """Test details are returned in order, missing ids reported"""
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+        recipes = [
+            sample_recipe(self.user, f'Recipe {n}') for n in range(3)
+        ]
+        recipes[0].tags.add(tag)
+        other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        theirs = sample_recipe(other)
+        ids = [recipes[2].id, theirs.id, recipes[0].id, 999, recipes[2].id]
+
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                BATCH_URL, {'ids': ','.join(str(pk) for pk in ids)}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['recipes'],
+            RecipeDetailSerializer([recipes[2], recipes[0]], many=True).data
+        )
+        self.assertEqual(res.data['missing'], [theirs.id, 999])
+
+    @override_settings(RECIPE_IDS_LIMIT=2)
+    def test_invalid_ids(self):
+        """Test missing, malformed and too many ids are rejected"""
+        for params in ({}, {'ids': '1,x'}, {'ids': '1,2,3'}):
+            res = self.client.get(BATCH_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', res.data)
@@ -0,0 +1,150 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import CatalogTag, CatalogIngredient, Tag, Ingredient
+
+
+CATALOG_TAGS_URL = reverse('recipe:catalog-tag-list')
+CATALOG_INGREDIENTS_URL = reverse('recipe:catalog-ingredient-list')
+
+
+class CatalogApiTests(TestCase):
+    """Test the catalog shared by all users"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def entries(self, model=CatalogTag):
+        return dict(model.objects.values_list('name', 'user_count'))
+
+    def test_same_name_one_entry(self):
+        """Test users' tags named alike share a catalog entry"""
+        mine = Tag.objects.create(user=self.user, name='Vegan')
+        theirs = Tag.objects.create(user=self.other, name=' VEGAN ')
+
+        self.assertEqual(mine.canonical, theirs.canonical)
+        self.assertEqual(self.entries(), {'vegan': 2})
+
+    def test_rename_and_delete(self):
+        """Test renamed and deleted tags move the catalog counts"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.other, name='Vegan')
+
+        tag.name = 'Dessert'
+        tag.save()
+        self.assertEqual(self.entries(), {'vegan': 1, 'dessert': 1})
+
+        tag.delete()
+        self.assertEqual(self.entries(), {'vegan': 1, 'dessert': 0})
+
+    def test_created_by_name(self):
+        """Test ingredients created with a recipe are linked and counted"""
+        Ingredient.objects.create(user=self.other, name='Salt')
+
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup',
+            'time_minutes': 20,
+            'price': '3.00',
+            'ingredient_names': ['salt', 'Water'],
+        }, format='json')
+
+        self.assertEqual(
+            self.entries(CatalogIngredient), {'salt': 2, 'water': 1}
+        )
+        self.assertFalse(
+            Ingredient.objects.filter(canonical__isnull=True).exists()
+        )
+
+    @override_settings(CATALOG_MIN_USERS=1)
+    def test_list_most_used_first(self):
+        """Test the catalog lists every user's names, most used first"""
+        for user in (self.user, self.other):
+            Ingredient.objects.create(user=user, name='Salt')
+        Ingredient.objects.create(user=self.other, name='Sugar')
+        Ingredient.objects.create(user=self.other, name='Pepper')
+
+        res = self.client.get(CATALOG_INGREDIENTS_URL, {'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(
+            [(entry['name'], entry['user_count'])
+             for entry in res.data['results']],
+            [('salt', 2), ('pepper', 1)]
+        )
+
+    @override_settings(CATALOG_MIN_USERS=1)
+    def test_search(self):
+        """Test searching by prefix, whatever the case and spacing"""
+        Tag.objects.create(user=self.other, name='Quick')
+        Tag.objects.create(user=self.other, name='Quick lunch')
+        Tag.objects.create(user=self.other, name='Vegan')
+
+        res = self.client.get(CATALOG_TAGS_URL, {'search': ' QUICK  l'})
+
+        self.assertEqual(
+            [entry['name'] for entry in res.data['results']], ['quick lunch']
+        )
+
+    def test_rare_names_hidden(self):
+        """Test names used by fewer than CATALOG_MIN_USERS users are
+        neither listed nor found"""
+        third = get_user_model().objects.create_user(
+            'third@bgwebagency.com',
+            'django1234'
+        )
+        for user in (self.user, self.other, third):
+            Tag.objects.create(user=user, name='Vegan')
+        for user in (self.user, self.other):
+            Tag.objects.create(user=user, name='Quick')
+        Tag.objects.create(user=self.other, name='Valerie\'s secret cake')
+
+        with self.settings(CATALOG_MIN_USERS=3):
+            listed = self.client.get(CATALOG_TAGS_URL)
+            found = self.client.get(CATALOG_TAGS_URL, {'search': 'va'})
+
+        self.assertEqual(
+            [entry['name'] for entry in listed.data['results']], ['vegan']
+        )
+        self.assertEqual(found.data['count'], 0)
+
+    def test_counts_distinct_users(self):
+        """Test a user's several tags of one name count them once, until
+        the last one is gone"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Alice secret', 'alice  SECRET', 'Other')
+        ]
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup',
+            'time_minutes': 20,
+            'price': '3.00',
+            'tag_names': ['ALICE secret'],
+        }, format='json')
+        self.assertEqual(self.entries(), {'alice secret': 1, 'other': 1})
+
+        tags[0].name = 'Other'
+        tags[0].save()
+        tags[1].delete()
+        self.assertEqual(self.entries(), {'alice secret': 1, 'other': 1})
+
+        Tag.objects.filter(user=self.user, name='ALICE secret').delete()
+        self.assertEqual(self.entries(), {'alice secret': 0, 'other': 1})
+
+    def test_login_required(self):
+        res = APIClient().get(CATALOG_TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
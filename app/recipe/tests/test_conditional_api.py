@@ -0,0 +1,194 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalRecipeApiTests(TestCase):
+    """Test ETag/Last-Modified handling of the recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cake',
+            time_minutes=30,
+            price=5.00
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+        self.recipe.tags.add(self.tag)
+        self.url = detail_url(self.recipe.id)
+
+    def etag(self, url=None):
+        return self.client.get(url or self.url)['ETag']
+
+    def test_detail_not_modified(self):
+        """Test an unchanged recipe is answered with a cheap 304"""
+        res = self.client.get(self.url)
+        self.assertTrue(res['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', res)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        # only the recipe itself, nothing prefetched or serialized
+        self.assertEqual(len(queries), 1)
+
+    def test_detail_if_modified_since(self):
+        """Test If-Modified-Since is honoured"""
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_update(self):
+        """Test the ETag changes when the recipe is updated"""
+        etag = self.etag()
+
+        res = self.client.patch(self.url, {'title': 'Cheese cake'})
+
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res['ETag'], self.etag())
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_on_links_and_tag_rename(self):
+        """Test tag changes outside the recipe API change its ETag"""
+        etag = self.etag()
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.assertNotEqual(self.etag(), etag)
+
+        etag = self.etag()
+        self.tag.name = 'Sweet'
+        self.tag.save()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_list_not_modified(self):
+        """Test the list answers 304 until a recipe is added"""
+        etag = self.etag(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Recipe.objects.create(
+            user=self.user, title='Pie', time_minutes=20, price=4.00
+        )
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+
+    def test_list_delete_not_hidden_by_if_modified_since(self):
+        """Test the list has no Last-Modified, a deleted recipe would not
+        move it"""
+        Recipe.objects.create(
+            user=self.user, title='Pie', time_minutes=20, price=4.00
+        )
+        self.assertNotIn('Last-Modified', self.client.get(RECIPES_URL))
+
+        self.client.delete(self.url)
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=http_date(
+                timezone.now().timestamp() + 60
+            )
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['title'] for r in res.data], ['Pie'])
+
+    def test_detail_renders_only_what_the_etag_covers(self):
+        """Test nested tags leave out recipe_count, which changes without
+        the recipe"""
+        etag = self.etag()
+        pie = Recipe.objects.create(
+            user=self.user, title='Pie', time_minutes=20, price=4.00
+        )
+        pie.tags.add(self.tag)
+
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(
+            self.client.get(self.url).data['tags'],
+            [{'id': self.tag.id, 'name': 'Dessert'}]
+        )
+
+    def test_update_if_match(self):
+        """Test writes with a current If-Match succeed"""
+        res = self.client.patch(
+            self.url, {'title': 'Cheese cake'}, HTTP_IF_MATCH=self.etag()
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_if_match_stale(self):
+        """Test writes with a stale If-Match fail with 412"""
+        etag = self.etag()
+        self.client.patch(self.url, {'title': 'Cheese cake'})
+
+        res = self.client.put(self.url, {
+            'title': 'Pie', 'time_minutes': 10, 'price': '3.00',
+        }, HTTP_IF_MATCH=etag)
+        delete = self.client.delete(self.url, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(
+            delete.status_code, status.HTTP_412_PRECONDITION_FAILED
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'Cheese cake')
+
+    def test_delete_if_match_any(self):
+        """Test If-Match: * matches any current version"""
+        res = self.client.delete(self.url, HTTP_IF_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_if_match_checked_on_locked_row(self):
+        """Test If-Match is checked against the recipe read under lock, not
+        the one a concurrent write changed since"""
+        etag = self.etag()
+        get_object = RecipeViewSet.get_object
+
+        def read_then_concurrent_write(view):
+            recipe = get_object(view)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                title='Theirs', updated_at=timezone.now()
+            )
+            return recipe
+
+        with patch.object(
+                RecipeViewSet, 'get_object', read_then_concurrent_write):
+            res = self.client.patch(
+                self.url, {'title': 'Mine'}, HTTP_IF_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
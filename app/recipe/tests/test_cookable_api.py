@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+
+COOKABLE_URL = reverse('recipe:recipe-cookable')
+
+
+class CookableRecipesApiTests(TestCase):
+    """Test the pantry query of the recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Flour', 'Sugar', 'Milk')
+        }
+        self.make_recipe('Pancakes', 'Egg', 'Flour', 'Milk')
+        self.make_recipe('Omelette', 'Egg')
+        self.make_recipe('Cake', 'Egg', 'Flour', 'Sugar', 'Milk')
+
+    def make_recipe(self, title, *ingredients):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=30,
+            price=5.00
+        )
+        recipe.ingredients.add(*(self.ingredients[i] for i in ingredients))
+        return recipe
+
+    def cookable(self, *ingredients, **params):
+        params['ingredients'] = ','.join(
+            str(self.ingredients[name].id) for name in ingredients
+        )
+        res = self.client.get(COOKABLE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_all_ingredients_owned(self):
+        """Test only recipes whose ingredients are all owned are listed"""
+        res = self.cookable('Egg', 'Flour', 'Milk')
+
+        self.assertEqual(
+            [recipe['title'] for recipe in res], ['Pancakes', 'Omelette']
+        )
+        self.assertEqual(res[0]['missing_ingredients'], [])
+
+    def test_allowed_missing(self):
+        """Test recipes missing up to k ingredients, fewest missing first"""
+        res = self.cookable('Egg', 'Flour', missing=2)
+
+        self.assertEqual(
+            [recipe['title'] for recipe in res],
+            ['Omelette', 'Pancakes', 'Cake']
+        )
+        self.assertEqual(
+            res[2]['missing_ingredients'],
+            sorted([self.ingredients['Sugar'].id, self.ingredients['Milk'].id])
+        )
+
+    def test_empty_pantry_and_tags(self):
+        """Test an empty pantry and combining with the tags filter"""
+        omelette = Recipe.objects.get(title='Omelette')
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        omelette.tags.add(tag)
+
+        self.assertEqual(self.cookable(), [])
+        res = self.cookable(missing=1, tags=str(tag.id))
+        self.assertEqual([recipe['title'] for recipe in res], ['Omelette'])
+
+    def test_invalid_params(self):
+        res = self.client.get(COOKABLE_URL, {'ingredients': '1,x'})
+        missing = self.client.get(COOKABLE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(missing.status_code, status.HTTP_400_BAD_REQUEST)
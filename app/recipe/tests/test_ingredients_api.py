@@ -100,6 +100,8 @@ class PrivateIngredientsApiTests(TestCase):
             user=self.user
         )
         recipe.ingredients.add(ingredient1)
+        # recipe_count was incremented in the DB
+        ingredient1.refresh_from_db()
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
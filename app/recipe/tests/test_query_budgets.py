@@ -0,0 +1,339 @@
+import itertools
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import AuthToken, ChangeLog, PublishedRecipe, Tag, \
+    Ingredient, Recipe
+from recipe import sharing
+from core.tests.query_budget import QueryBudgetMixin, load_budgets
+
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+SYNC_URL = reverse('recipe:sync')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test endpoints run a constant, budgeted number of queries"""
+    query_budgets = load_budgets(BUDGETS_FILE)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def make_recipes(self, size):
+        """Grow the user's data to size recipes, each with a tag and an
+        ingredient of its own, and return the first recipe"""
+        existing = Recipe.objects.filter(user=self.user).count()
+        for n in range(existing, size):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {n}',
+                time_minutes=10,
+                price=5.00
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{n}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'I{n}')
+            )
+        return Recipe.objects.filter(user=self.user).order_by('id').first()
+
+    def make_tag(self):
+        return Tag.objects.create(user=self.user, name='New tag')
+
+    def test_recipe_list_budget(self):
+        """Test listing recipes doesn't run queries per recipe"""
+        self.assertQueryBudget(
+            'recipe-list',
+            self.make_recipes,
+            lambda recipe: self.client.get(RECIPES_URL)
+        )
+
+    def test_recipe_batch_budget(self):
+        """Test retrieving many recipes doesn't run queries per recipe"""
+        def make_data(size):
+            self.make_recipes(size)
+            return {
+                'ids': ','.join(str(pk) for pk in (
+                    Recipe.objects.values_list('id', flat=True)
+                )),
+            }
+
+        self.assertQueryBudget(
+            'recipe-batch',
+            make_data,
+            lambda params: self.client.get(
+                reverse('recipe:recipe-batch'), params
+            )
+        )
+
+    def test_recipe_cookable_budget(self):
+        """Test the pantry query doesn't run queries per recipe"""
+        def make_data(size):
+            self.make_recipes(size)
+            return {
+                'ingredients': ','.join(str(pk) for pk in (
+                    Ingredient.objects.values_list('id', flat=True)
+                )),
+            }
+
+        self.assertQueryBudget(
+            'recipe-cookable',
+            make_data,
+            lambda params: self.client.get(
+                reverse('recipe:recipe-cookable'), params
+            )
+        )
+
+    def test_recipe_filter_budget(self):
+        """Test filtering recipes doesn't run queries per recipe"""
+        def make_data(size):
+            self.make_recipes(size)
+            return {
+                'tags': ','.join(
+                    str(pk) for pk in Tag.objects.values_list('id', flat=True)
+                ),
+            }
+
+        self.assertQueryBudget(
+            'recipe-list-filtered',
+            make_data,
+            lambda params: self.client.get(RECIPES_URL, params)
+        )
+
+    def test_recipe_detail_budget(self):
+        """Test retrieving a recipe doesn't depend on the recipe count"""
+        self.assertQueryBudget(
+            'recipe-detail',
+            self.make_recipes,
+            lambda recipe: self.client.get(detail_url(recipe.id))
+        )
+
+    def test_recipe_create_budget(self):
+        """Test creating a recipe doesn't depend on the recipe count"""
+        def make_data(size):
+            recipe = self.make_recipes(size)
+            return {
+                'title': 'New recipe',
+                'time_minutes': 5,
+                'price': '2.50',
+                'tags': [tag.id for tag in recipe.tags.all()],
+                'ingredients': [
+                    ingredient.id for ingredient in recipe.ingredients.all()
+                ],
+            }
+
+        self.assertQueryBudget(
+            'recipe-create',
+            make_data,
+            lambda payload: self.client.post(
+                RECIPES_URL, payload, format='json'
+            )
+        )
+
+    def test_recipe_create_by_name_budget(self):
+        """Test creating tags by name doesn't run queries per name"""
+        def make_data(size):
+            self.make_recipes(size)
+            # half existing names, half new ones, growing with the data up
+            # to the most a request may send
+            names = list(
+                Tag.objects.filter(user=self.user)
+                .values_list('name', flat=True)
+                [:min(size, settings.RECIPE_NAMES_LIMIT // 2)]
+            )
+            return {
+                'title': 'New recipe',
+                'time_minutes': 5,
+                'price': '2.50',
+                'tag_names': names + [f'{name} new {size}' for name in names],
+            }
+
+        self.assertQueryBudget(
+            'recipe-create-by-name',
+            make_data,
+            lambda payload: self.client.post(
+                RECIPES_URL, payload, format='json'
+            )
+        )
+
+    def test_recipe_update_budget(self):
+        """Test replacing a recipe's tags and ingredients in bulk"""
+        def make_data(size):
+            recipe = self.make_recipes(size)
+            # new tags and ingredient every time: links change at each size
+            return recipe, {
+                'title': 'Updated',
+                'time_minutes': 5,
+                'price': '2.50',
+                'tags': [self.make_tag().id, self.make_tag().id],
+                'ingredients': [
+                    Ingredient.objects.create(user=self.user, name='New').id
+                ],
+            }
+
+        self.assertQueryBudget(
+            'recipe-update',
+            make_data,
+            lambda data: self.client.put(
+                detail_url(data[0].id), data[1], format='json'
+            )
+        )
+
+    def test_recipe_partial_update_budget(self):
+        """Test patching a recipe's tags doesn't touch other relations"""
+        def make_data(size):
+            recipe = self.make_recipes(size)
+            return recipe, {'tags': [self.make_tag().id, self.make_tag().id]}
+
+        self.assertQueryBudget(
+            'recipe-partial-update',
+            make_data,
+            lambda data: self.client.patch(
+                detail_url(data[0].id), data[1], format='json'
+            )
+        )
+
+    def test_tag_list_budget(self):
+        """Test listing tags doesn't run queries per tag"""
+        self.assertQueryBudget(
+            'tag-list',
+            self.make_recipes,
+            lambda recipe: self.client.get(TAGS_URL, {'assigned_only': 1})
+        )
+
+    def test_ingredient_list_budget(self):
+        """Test listing ingredients doesn't run queries per ingredient"""
+        self.assertQueryBudget(
+            'ingredient-list',
+            self.make_recipes,
+            lambda recipe: self.client.get(
+                INGREDIENTS_URL, {'assigned_only': 1}
+            )
+        )
+
+    def test_tag_create_budget(self):
+        """Test creating a tag doesn't depend on the tag count"""
+        # a name new to the catalog too, the most expensive case
+        numbers = itertools.count()
+        self.assertQueryBudget(
+            'tag-create',
+            self.make_recipes,
+            lambda recipe: self.client.post(
+                TAGS_URL, {'name': f'New tag {next(numbers)}'}
+            )
+        )
+
+    def test_sync_budget(self):
+        """Test a sync snapshot doesn't run queries per object"""
+        self.assertQueryBudget(
+            'sync',
+            self.make_recipes,
+            lambda recipe: self.client.get(SYNC_URL)
+        )
+
+    @override_settings(SYNC_COMMIT_WINDOW=0)
+    def test_sync_changes_budget(self):
+        """Test syncing changes doesn't run queries per change"""
+        def make_data(size):
+            self.make_recipes(size)
+            return {'since': ChangeLog.objects.earliest('id').id}
+
+        self.assertQueryBudget(
+            'sync-changes',
+            make_data,
+            lambda params: self.client.get(SYNC_URL, params)
+        )
+
+    def test_recipe_publish_budget(self):
+        """Test publishing a recipe doesn't depend on the recipe count"""
+        def make_data(size):
+            PublishedRecipe.objects.all().delete()
+            return self.make_recipes(size)
+
+        self.assertQueryBudget(
+            'recipe-publish',
+            make_data,
+            lambda recipe: self.client.post(
+                reverse('recipe:recipe-publish', args=[recipe.id])
+            )
+        )
+
+    def test_recipe_shared_budget(self):
+        """Test a shared recipe missing from the cache is one read"""
+        def make_data(size):
+            recipe = self.make_recipes(size)
+            slug = sharing.publish(recipe).slug
+            caches[settings.SHARED_RECIPE_CACHE].clear()
+            return slug
+
+        self.assertQueryBudget(
+            'recipe-shared',
+            make_data,
+            lambda slug: APIClient().get(
+                reverse('recipe:shared-recipe', args=[slug])
+            )
+        )
+
+    def test_token_revoke_budget(self):
+        """Test revoking every token is one DELETE whatever their number"""
+        def make_data(size):
+            for _ in range(size):
+                AuthToken.objects.create(user=self.user)
+
+        self.assertQueryBudget(
+            'user-token-revoke',
+            make_data,
+            lambda data: self.client.post(
+                reverse('user:token-revoke'), {'all': True}
+            )
+        )
+
+    def test_user_delete_budget(self):
+        """Test closing an account doesn't depend on the amount of data"""
+        numbers = itertools.count()
+
+        def make_data(size):
+            # a new account every time, with size recipes
+            self.user = get_user_model().objects.create_user(
+                f'user{next(numbers)}@bgwebagency.com', 'django1234'
+            )
+            self.make_recipes(size)
+            self.client.force_authenticate(self.user)
+
+        self.assertQueryBudget(
+            'user-delete',
+            make_data,
+            lambda data: self.client.delete(reverse('user:me'))
+        )
+
+    # every user's names are their own here, list them all
+    @override_settings(CATALOG_MIN_USERS=1)
+    def test_catalog_list_budget(self):
+        """Test a catalog page doesn't depend on the catalog size"""
+        self.assertQueryBudget(
+            'catalog-ingredient-list',
+            self.make_recipes,
+            lambda recipe: self.client.get(
+                reverse('recipe:catalog-ingredient-list'), {'search': 'i'}
+            )
+        )
@@ -7,6 +7,7 @@ import os
 # helps to create test image that can be used to upload image
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
@@ -186,6 +187,111 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_other_users_tag_fails(self):
+        """Test tags of another user can't be attached to a recipe"""
+        user2 = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        tag = sample_tag(user=user2)
+        payload = {
+            'title': 'Avocado lime cheese cake',
+            'tags': [tag.id],
+            'time_minutes': 60,
+            'price': 20.00
+        }
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_reports_all_missing_ids(self):
+        """Test every unknown ingredient id is reported at once"""
+        ingredient = sample_ingredient(user=self.user)
+        payload = {
+            'title': 'Thai prawn red curry',
+            'ingredients': [ingredient.id, 9998, 9999],
+            'time_minutes': 20,
+            'price': 7.00
+        }
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('9998', res.data['ingredients'][0])
+        self.assertIn('9999', res.data['ingredients'][0])
+
+    def test_create_recipe_with_tag_and_ingredient_names(self):
+        """Test creating a recipe with new and existing tags by name"""
+        vegan = sample_tag(user=self.user, name='Vegan')
+        other_user = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        sample_tag(user=other_user, name='Dessert')
+        payload = {
+            'title': 'Avocado lime cheese cake',
+            'tag_names': ['Vegan', 'Dessert', 'Dessert'],
+            'ingredient_names': ['Avocado', 'Lime'],
+            'time_minutes': 60,
+            'price': 20.00
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        dessert = Tag.objects.get(user=self.user, name='Dessert')
+        self.assertEqual(set(recipe.tags.all()), {vegan, dessert})
+        self.assertEqual(
+            set(recipe.ingredients.values_list('name', flat=True)),
+            {'Avocado', 'Lime'}
+        )
+        self.assertEqual(sorted(res.data['tags']), [vegan.id, dessert.id])
+        self.assertNotIn('tag_names', res.data)
+
+    def test_partial_update_recipe_adds_named_tags(self):
+        """Test tag ids and names can be combined in a patch"""
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(sample_ingredient(user=self.user))
+        tag = sample_tag(user=self.user)
+
+        res = self.client.patch(detail_url(recipe.id), {
+            'tags': [tag.id], 'tag_names': [tag.name, 'Curry'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {tag.name, 'Curry'}
+        )
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_partial_update_recipe_names_only_adds(self):
+        """Test a patch with tag names only keeps the current tags"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.patch(detail_url(recipe.id), {
+            'tag_names': ['Curry', tag.name],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {tag.name, 'Curry'}
+        )
+
+    def test_too_many_names(self):
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 10, 'price': '5.00',
+            'tag_names': [
+                f'Tag {n}' for n in range(settings.RECIPE_NAMES_LIMIT + 1)
+            ],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+
     def test_partial_update_recipe(self):
         """Test updating a recipe with patch"""
         recipe = sample_recipe(user=self.user)
@@ -317,3 +423,10 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+    def test_filter_invalid_ids(self):
+        """Test filtering with ids that aren't numbers is a bad request"""
+        res = self.client.get(RECIPES_URL, {'tags': '1,two'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
@@ -0,0 +1,63 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.renderers import msgpack
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ResponseFormatTests(TestCase):
+    """Test the formats recipes can be fetched in"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user,
+            title='Cake',
+            time_minutes=30,
+            price=5.00
+        )
+
+    def test_json_by_default(self):
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    @skipUnless(msgpack, 'msgpack not installed')
+    def test_msgpack(self):
+        """Test MessagePack is sent to clients asking for it"""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        recipes = msgpack.unpackb(res.content, raw=False)
+        self.assertEqual(recipes[0]['title'], 'Cake')
+        self.assertEqual(recipes[0]['price'], '5.00')
+
+    def test_json_round_trip(self):
+        """Test JSON bodies are parsed and prices sent back exactly"""
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Pie',
+            'time_minutes': 20,
+            'price': '4.10',
+        }, format='json')
+        bad = self.client.post(
+            RECIPES_URL, '{"title": ', content_type='application/json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn(b'"price":"4.10"', res.content)
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
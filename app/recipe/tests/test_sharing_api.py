@@ -0,0 +1,177 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe
+
+
+purged = []
+
+
+def record_purge(keys):
+    """Stand-in CDN purge function"""
+    purged.extend(keys)
+
+
+def publish_url(recipe_id):
+    return reverse('recipe:recipe-publish', args=[recipe_id])
+
+
+def shared_url(slug):
+    return reverse('recipe:shared-recipe', args=[slug])
+
+
+class SharingTestMixin:
+
+    def setUp(self):
+        # cached snapshots outlive the test's rolled back data
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.anonymous = APIClient()
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cake',
+            time_minutes=30,
+            price=5.00
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+        self.recipe.tags.add(self.tag)
+
+    def publish(self):
+        res = self.client.post(publish_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['slug']
+
+    def shared(self, slug, **headers):
+        return self.anonymous.get(shared_url(slug), **headers)
+
+
+class SharedRecipeApiTests(SharingTestMixin, TestCase):
+    """Test public links to recipes"""
+
+    def test_publish_and_read(self):
+        """Test a published recipe is public, then served from the cache"""
+        slug = self.publish()
+
+        res = self.shared(slug)
+        with self.assertNumQueries(0):
+            cached = self.shared(slug)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), {
+            'title': 'Cake',
+            'time_minutes': 30,
+            'price': '5.00',
+            'link': '',
+            'image': None,
+            'tags': ['Dessert'],
+            'ingredients': [],
+        })
+        self.assertEqual(cached.content, res.content)
+        self.assertIn('public', cached['Cache-Control'])
+        self.assertIn('s-maxage=86400', cached['Cache-Control'])
+        self.assertEqual(cached['Surrogate-Key'], f'recipe-{self.recipe.id}')
+
+    def test_publish_twice_same_link(self):
+        slug = self.publish()
+
+        self.assertEqual(self.publish(), slug)
+
+    def test_not_modified(self):
+        slug = self.publish()
+        etag = self.shared(slug)['ETag']
+
+        res = self.shared(slug, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_edits_refresh_snapshot(self):
+        """Test recipe edits and tag renames reach the public link"""
+        slug = self.publish()
+        self.shared(slug)
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+            {'title': 'Cheese cake'}
+        )
+        self.assertEqual(json.loads(self.shared(slug).content)['title'],
+                         'Cheese cake')
+
+        self.tag.name = 'Sweet'
+        self.tag.save()
+        self.assertEqual(json.loads(self.shared(slug).content)['tags'],
+                         ['Sweet'])
+
+    def test_unpublish(self):
+        """Test unpublished links stop working, republishing makes a new
+        one"""
+        slug = self.publish()
+        self.shared(slug)
+
+        res = self.client.delete(publish_url(self.recipe.id))
+        new_slug = self.publish()
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotEqual(new_slug, slug)
+        self.assertEqual(
+            self.shared(slug).status_code, status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.shared(new_slug).status_code, status.HTTP_200_OK
+        )
+
+    def test_not_found(self):
+        """Test unknown slugs, other users' recipes and writes"""
+        other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        theirs = Recipe.objects.create(
+            user=other, title='Pie', time_minutes=20, price=4.00
+        )
+        slug = self.publish()
+
+        publish = self.client.post(publish_url(theirs.id))
+
+        self.assertEqual(publish.status_code, status.HTTP_404_NOT_FOUND)
+        for unknown in ('nope', f'{self.recipe.id}-guess', f'{theirs.id}-x'):
+            self.assertEqual(
+                self.shared(unknown).status_code, status.HTTP_404_NOT_FOUND
+            )
+        self.assertEqual(
+            self.anonymous.post(shared_url(slug)).status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+
+
+@override_settings(SHARED_RECIPE_PURGE=f'{__name__}.record_purge')
+class SharedRecipePurgeTests(SharingTestMixin, TransactionTestCase):
+    """Test CDN purges once edits are committed"""
+
+    def setUp(self):
+        super().setUp()
+        purged.clear()
+
+    def test_purge_published_only(self):
+        """Test edits of published recipes purge their surrogate key"""
+        unpublished = Recipe.objects.create(
+            user=self.user, title='Pie', time_minutes=20, price=4.00
+        )
+        self.publish()
+
+        unpublished.tags.add(self.tag)
+        self.recipe.tags.remove(self.tag)
+        self.client.delete(publish_url(self.recipe.id))
+
+        self.assertEqual(purged, [f'recipe-{self.recipe.id}'] * 2)
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+class ShoppingListApiTests(TestCase):
+    """Test combining recipes into a shopping list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def make_recipe(self, title, *ingredients, user=None):
+        user = user or self.user
+        recipe = Recipe.objects.create(
+            user=user,
+            title=title,
+            time_minutes=30,
+            price=5.00
+        )
+        recipe.ingredients.add(*(
+            Ingredient.objects.get_or_create(user=user, name=name)[0]
+            for name in ingredients
+        ))
+        return recipe
+
+    def get(self, *recipes):
+        return self.client.get(SHOPPING_LIST_URL, {
+            'ids': ','.join(str(recipe.id) for recipe in recipes),
+        })
+
+    def test_shopping_list(self):
+        """Test ingredients are combined by name across recipes"""
+        cake = self.make_recipe('Cake', 'Flour', 'Egg', 'Sugar')
+        bread = self.make_recipe('Bread', 'Flour', 'Salt')
+        # another ingredient row with the same name
+        omelette = self.make_recipe('Omelette', 'egg')
+
+        with self.assertNumQueries(2):
+            res = self.get(cake, bread, omelette, cake)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipes'], [cake.id, bread.id, omelette.id])
+        self.assertEqual(res.data['missing'], [])
+        lines = {
+            line['name'].lower(): line['recipes']
+            for line in res.data['ingredients']
+        }
+        self.assertEqual(lines, {
+            'egg': [cake.id, omelette.id],
+            'flour': [cake.id, bread.id],
+            'salt': [bread.id],
+            'sugar': [cake.id],
+        })
+        egg = res.data['ingredients'][0]
+        self.assertEqual(len(egg['ingredients']), 2)
+        self.assertEqual(egg['recipe_count'], 2)
+
+    def test_missing_recipes(self):
+        """Test unknown and other users' recipes are reported missing"""
+        other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        cake = self.make_recipe('Cake', 'Flour')
+        theirs = self.make_recipe('Pie', 'Apple', user=other)
+
+        res = self.get(cake, theirs)
+
+        self.assertEqual(res.data['missing'], [theirs.id])
+        self.assertEqual(
+            [line['name'] for line in res.data['ingredients']], ['Flour']
+        )
+
+    @override_settings(RECIPE_IDS_LIMIT=1)
+    def test_invalid_ids(self):
+        cake = self.make_recipe('Cake')
+        pie = self.make_recipe('Pie')
+
+        res = self.client.get(SHOPPING_LIST_URL)
+        malformed = self.client.get(SHOPPING_LIST_URL, {'ids': '1,x'})
+        too_many = self.get(cake, pie)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(malformed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(too_many.status_code, status.HTTP_400_BAD_REQUEST)
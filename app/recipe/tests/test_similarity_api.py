@@ -0,0 +1,157 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe import similarity
+
+
+def similar_url(recipe_id):
+    """Return the similar recipes URL of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class SimilarityTestMixin:
+
+    def setUp(self):
+        # indexes and version stamps outlive the test's rolled back data
+        similarity._indexes.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = {
+            name: Tag.objects.create(user=self.user, name=name)
+            for name in ('Dessert', 'Vegan', 'Quick')
+        }
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Sugar', 'Flour', 'Salt')
+        }
+
+    def make_recipe(self, title, tags=(), ingredients=()):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=30,
+            price=5.00
+        )
+        recipe.tags.add(*(self.tags[name] for name in tags))
+        recipe.ingredients.add(
+            *(self.ingredients[name] for name in ingredients)
+        )
+        return recipe
+
+    def similar(self, recipe, **params):
+        res = self.client.get(similar_url(recipe.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(r['title'], r['similarity']) for r in res.data]
+
+
+class SimilarRecipesApiTests(SimilarityTestMixin, TestCase):
+    """Test the similar recipes API"""
+
+    def setUp(self):
+        super().setUp()
+        self.cake = self.make_recipe(
+            'Cake', ('Dessert', 'Vegan'), ('Sugar', 'Flour')
+        )
+        self.make_recipe('Cookies', ('Dessert',), ('Sugar', 'Flour'))
+        self.make_recipe('Bread', ('Vegan',), ('Flour', 'Salt'))
+        self.make_recipe('Soup', ('Quick',), ('Salt',))
+
+    def test_ranked_by_jaccard(self):
+        """Test recipes sharing most features come first, unrelated never"""
+        self.assertEqual(self.similar(self.cake), [
+            ('Cookies', 0.75), ('Bread', 0.4),
+        ])
+
+    def test_cosine_and_limit(self):
+        self.assertEqual(
+            self.similar(self.cake, metric='cosine', limit=1),
+            [('Cookies', 0.866)]
+        )
+
+    def test_invalid_params(self):
+        res = self.client.get(similar_url(self.cake.id), {'limit': 0})
+        metric = self.client.get(similar_url(self.cake.id), {'metric': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(metric.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipes(self):
+        """Test other users' recipes are neither looked up nor suggested"""
+        other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        theirs = Recipe.objects.create(
+            user=other, title='Their cake', time_minutes=30, price=5.00
+        )
+        theirs.tags.add(self.tags['Dessert'])
+
+        res = self.client.get(similar_url(theirs.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('Their cake', dict(self.similar(self.cake)))
+
+
+class SimilarityIndexUpdateTests(SimilarityTestMixin, TransactionTestCase):
+    """Test the index follows committed changes without being rebuilt"""
+
+    def setUp(self):
+        super().setUp()
+        self.cake = self.make_recipe('Cake', ('Dessert',), ('Sugar',))
+        self.pie = self.make_recipe('Pie', ('Dessert',), ('Flour',))
+        self.similar(self.cake)
+        self.index = similarity._indexes[self.user.id]
+
+    def assertNotRebuilt(self):
+        self.assertIs(similarity._indexes[self.user.id], self.index)
+
+    def test_links_changed(self):
+        """Test links set through the API and reverse adds are applied"""
+        url = reverse('recipe:recipe-detail', args=[self.pie.id])
+        self.client.patch(url, {
+            'ingredients': [self.ingredients['Sugar'].id],
+        }, format='json')
+        self.assertEqual(self.similar(self.cake), [('Pie', 1.0)])
+
+        self.tags['Vegan'].recipe_set.add(self.pie)
+        self.assertEqual(self.similar(self.cake), [('Pie', 0.6667)])
+        self.assertNotRebuilt()
+
+    def test_deleted(self):
+        """Test deleted tags and recipes leave the index"""
+        self.tags['Dessert'].delete()
+        self.assertEqual(self.similar(self.cake), [])
+
+        self.pie.ingredients.add(self.ingredients['Sugar'])
+        self.assertEqual(self.similar(self.cake), [('Pie', 0.5)])
+        self.pie.delete()
+        self.assertEqual(self.similar(self.cake), [])
+        self.assertNotRebuilt()
+
+    def test_missed_change_rebuilds(self):
+        """Test a change made by another worker triggers a rebuild"""
+        similarity.bump_version(self.user.id)
+        self.pie.ingredients.add(self.ingredients['Sugar'])
+
+        self.assertEqual(self.similar(self.cake), [('Pie', 0.6667)])
+        self.assertIsNot(similarity._indexes[self.user.id], self.index)
+
+    def test_old_index_rebuilds(self):
+        """Test an index older than the max age is rebuilt, in case the
+        version stamps of other workers can't be seen"""
+        with override_settings(RECIPE_SIMILARITY_MAX_AGE=0):
+            self.assertEqual(self.similar(self.cake), [('Pie', 0.3333)])
+
+        self.assertIsNot(similarity._indexes[self.user.id], self.index)
@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe
+
+
+SUMMARY_URL = reverse('recipe:recipe-summary')
+
+
+class PublicSummaryApiTests(TestCase):
+
+    def test_auth_required(self):
+        """Test authentication is required for the summary"""
+        res = APIClient().get(SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSummaryApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+
+    def make_recipe(self, price, time_minutes=10, user=None):
+        return Recipe.objects.create(
+            user=user or self.user,
+            title='Recipe',
+            time_minutes=time_minutes,
+            price=price
+        )
+
+    def test_summary(self):
+        """Test the summary totals, statistics and top tags"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        Tag.objects.create(user=self.user, name='Unused')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        for price, time_minutes in (('4.00', 10), ('12.50', 20), ('60', 45)):
+            self.make_recipe(price, time_minutes).tags.add(vegan)
+        self.make_recipe('8', user=get_user_model().objects.create_user(
+            'other@bgwebagency.com', 'django1234'
+        ))
+        quick.recipe_set.add(Recipe.objects.filter(user=self.user).first())
+
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['tag_count'], 3)
+        self.assertEqual(res.data['ingredient_count'], 1)
+        self.assertEqual(
+            res.data['time_minutes'], {'avg': 25.0, 'min': 10, 'max': 45}
+        )
+        self.assertEqual(res.data['price']['avg'], '25.50')
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price']['distribution']],
+            [1, 0, 1, 0, 1]
+        )
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['top_tags']],
+            [('Vegan', 3), ('Quick', 1)]
+        )
+        self.assertEqual(res.data['top_ingredients'], [])
+
+    def test_empty_summary(self):
+        """Test the summary of a user without recipes"""
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['price']['avg'])
+
+    def test_summary_cached(self):
+        """Test a repeated summary request runs no summary queries"""
+        self.make_recipe('5.00')
+        self.client.get(SUMMARY_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(SUMMARY_URL)
+
+        self.assertEqual(len(queries), 0)
+
+    def test_write_refreshes_changed_sections(self):
+        """Test writes drop only the summary sections they change"""
+        recipe = self.make_recipe('5.00')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(SUMMARY_URL)
+
+        recipe.tags.add(tag)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(SUMMARY_URL)
+
+        # tag count and top tags only, recipe aggregates come from cache
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(res.data['top_tags'][0]['recipe_count'], 1)
+
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Curry', 'time_minutes': 20, 'price': '7.00',
+        }, format='json')
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['price']['avg'], '6.00')
+
+    def test_recipe_delete_refreshes_summary(self):
+        """Test deleting a recipe updates counts and top tags"""
+        recipe = self.make_recipe('5.00')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.client.get(SUMMARY_URL)
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertEqual(res.data['top_tags'], [])
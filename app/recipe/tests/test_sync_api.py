@@ -0,0 +1,225 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLog, Tag, Ingredient, Recipe
+
+
+SYNC_URL = reverse('recipe:sync')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, title='Cake'):
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=30,
+        price=5.00
+    )
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated sync API access"""
+
+    def test_auth_required(self):
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_COMMIT_WINDOW=0)
+class PrivateSyncApiTests(TestCase):
+    """Test the delta sync API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@bgwebagency.com',
+            'django1234'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Dessert')
+        self.recipe = sample_recipe(self.user)
+        self.recipe.tags.add(self.tag)
+
+    def sync(self, since=None):
+        params = {} if since is None else {'since': since}
+        res = self.client.get(SYNC_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_snapshot(self):
+        """Test a client without a token gets all of its own data"""
+        other = get_user_model().objects.create_user(
+            'other@bgwebagency.com',
+            'django1234'
+        )
+        sample_recipe(other, 'Not mine')
+
+        data = self.sync()
+
+        self.assertFalse(data['reset'])
+        self.assertEqual(
+            [recipe['title'] for recipe in data['recipes']], ['Cake']
+        )
+        self.assertEqual(data['recipes'][0]['tags'], [self.tag.id])
+        self.assertEqual(
+            data['tags'], [{'id': self.tag.id, 'name': 'Dessert'}]
+        )
+        self.assertEqual(data['token'], ChangeLog.objects.latest('id').id)
+
+    def test_changes_since_token(self):
+        """Test only objects changed after the token are returned"""
+        token = self.sync()['token']
+        pie = sample_recipe(self.user, 'Pie')
+        Ingredient.objects.create(user=self.user, name='Salt')
+
+        data = self.sync(token)
+
+        self.assertEqual(
+            [recipe['id'] for recipe in data['recipes']], [pie.id]
+        )
+        self.assertEqual(data['tags'], [])
+        self.assertEqual([i['name'] for i in data['ingredients']], ['Salt'])
+        self.assertEqual(self.sync(data['token'])['recipes'], [])
+
+    def test_tag_rename_sends_its_recipes(self):
+        """Test a renamed tag is sent with the recipes showing it"""
+        token = self.sync()['token']
+        self.tag.name = 'Sweet'
+        self.tag.save()
+
+        data = self.sync(token)
+
+        self.assertEqual(data['tags'], [{'id': self.tag.id, 'name': 'Sweet'}])
+        self.assertEqual(
+            [recipe['id'] for recipe in data['recipes']], [self.recipe.id]
+        )
+
+    def test_tombstones(self):
+        """Test deleted objects are listed as deleted, not sent"""
+        token = self.sync()['token']
+        recipe_id = self.recipe.id
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe_id]))
+        # created and deleted since: a tombstone the client can ignore
+        temporary = Tag.objects.create(user=self.user, name='Temporary')
+        temporary_id = temporary.id
+        temporary.delete()
+
+        data = self.sync(token)
+
+        self.assertEqual(data['recipes'], [])
+        self.assertEqual(data['deleted']['recipes'], [recipe_id])
+        self.assertEqual(data['deleted']['tags'], [temporary_id])
+
+    def test_api_writes_logged(self):
+        """Test tags created by name through the recipe API are logged"""
+        token = self.sync()['token']
+        self.client.post(RECIPES_URL, {
+            'title': 'Curry',
+            'time_minutes': 20,
+            'price': '7.00',
+            'tag_names': ['Dinner'],
+        }, format='json')
+
+        data = self.sync(token)
+
+        self.assertEqual([tag['name'] for tag in data['tags']], ['Dinner'])
+        self.assertEqual(
+            [recipe['title'] for recipe in data['recipes']], ['Curry']
+        )
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_paging(self):
+        """Test a long list of changes is sent in pages"""
+        token = self.sync()['token']
+        for n in range(3):
+            sample_recipe(self.user, f'Recipe {n}')
+
+        first = self.sync(token)
+        second = self.sync(first['token'])
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(
+            [r['title'] for r in first['recipes'] + second['recipes']],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2']
+        )
+
+    def test_pruned_token_resets(self):
+        """Test a token older than the pruned log gets a full snapshot"""
+        token = self.sync()['token']
+        sample_recipe(self.user, 'Pie')
+        ChangeLog.objects.update(created=timezone.now() - timedelta(days=60))
+        sample_recipe(self.user, 'Tart')
+
+        out = StringIO()
+        call_command('prune_changelog', batch_size=1, stdout=out)
+        data = self.sync(token)
+
+        self.assertIn('Deleted', out.getvalue())
+        self.assertEqual(ChangeLog.objects.count(), 1)
+        self.assertTrue(data['reset'])
+        self.assertEqual(
+            [recipe['title'] for recipe in data['recipes']],
+            ['Cake', 'Pie', 'Tart']
+        )
+
+    def test_emptied_log_resets(self):
+        """Test a token kept while the whole log was pruned gets a full
+        snapshot, not an error"""
+        token = self.sync()['token']
+        ChangeLog.objects.all().delete()
+
+        data = self.sync(token)
+
+        self.assertTrue(data['reset'])
+        self.assertEqual(
+            [recipe['title'] for recipe in data['recipes']], ['Cake']
+        )
+
+    def test_invalid_token(self):
+        """Test a token that isn't a positive number is rejected"""
+        res = self.client.get(SYNC_URL, {'since': 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_future_token(self):
+        """Test a token that was never handed out is rejected"""
+        token = self.sync()['token']
+
+        res = self.client.get(SYNC_URL, {'since': token + 1})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recent_changes_held_back(self):
+        """Test the token stops before entries that may have uncommitted
+        lower ids, they are sent once the commit window passed"""
+        token = self.sync()['token']
+        sample_recipe(self.user, 'Pie')
+        ChangeLog.objects.filter(id__gt=token).update(
+            created=timezone.now() - timedelta(minutes=1)
+        )
+        sample_recipe(self.user, 'Tart')
+
+        with self.settings(SYNC_COMMIT_WINDOW=10):
+            snapshot = self.sync()
+            data = self.sync(token)
+        later = self.sync(data['token'])
+
+        self.assertLess(snapshot['token'], ChangeLog.objects.latest('id').id)
+        self.assertEqual(
+            [recipe['title'] for recipe in data['recipes']], ['Pie']
+        )
+        self.assertFalse(data['more'])
+        self.assertEqual(
+            [recipe['title'] for recipe in later['recipes']], ['Tart']
+        )
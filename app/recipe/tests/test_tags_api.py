@@ -100,6 +100,8 @@ class PrivateTagsApiTests(TestCase):
             user=self.user
         )
         recipe.tags.add(tag1)
+        # recipe_count was incremented in the DB
+        tag1.refresh_from_db()
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
@@ -10,10 +10,22 @@ router = DefaultRouter()
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
 router.register('recipes', views.RecipeViewSet)
+# names shared by all users
+router.register(
+    'catalog/tags', views.CatalogTagViewSet, basename='catalog-tag'
+)
+router.register(
+    'catalog/ingredients', views.CatalogIngredientViewSet,
+    basename='catalog-ingredient'
+)
 
 # app name for look up by reverse
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    # changes since a token, for offline clients
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    # public, read-only links to published recipes
+    path('shared/<slug:slug>/', views.shared_recipe, name='shared-recipe'),
 ]
@@ -1,23 +1,51 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, prefetch_related_objects
+from django.http import HttpResponse, HttpResponseNotFound
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, \
+    patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
 # action decorator to define custom actions for viewsets
 from rest_framework.decorators import action
 # to return a custom response
 from rest_framework.response import Response
 # mixin to extract only list view from viewsets
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework import viewsets, mixins, status, filters, generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Tag, Ingredient, Recipe
+from core import metrics
+from core.authentication import ExpiringTokenAuthentication
+from core.catalog import catalog_name
+from core.conditional import check_if_match, make_etag, not_modified, \
+    set_validators
+from core.deletion import soft_delete_recipes
+from core.models import CatalogTag, CatalogIngredient, PublishedRecipe, \
+    Tag, Ingredient, Recipe
+from core.pagination import CatalogPagination
+from core.throttling import RateLimitHeadersMixin, UserWriteRateThrottle
 
-from recipe import serializers
+from recipe import serializers, sharing
+from recipe.shopping import shopping_list
+from recipe.similarity import similar_recipes
+from recipe.summary import get_summary
+from recipe.sync import get_sync
 
 
-class BaseRecipeViewSet(viewsets.GenericViewSet,
+class BaseRecipeViewSet(RateLimitHeadersMixin,
+                        viewsets.GenericViewSet,
                         mixins.ListModelMixin,
                         mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_classes = (UserWriteRateThrottle,)
+    # ?ordering=-recipe_count: most used first, default is by name
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('name', 'recipe_count')
 
     # default queryset returns all objects - overwrite
     def get_queryset(self):
@@ -28,8 +56,8 @@ class BaseRecipeViewSet(viewsets.GenericViewSet,
         )  # T/F
         queryset = self.queryset
         if assigned_only:
-            # will return recipes that are assigned to the object
-            queryset = queryset.filter(recipe__isnull=False)
+            # objects used by a recipe, the count leaves deleted ones out
+            queryset = queryset.filter(recipe_count__gt=0)
         # return self.queryset.filter(user=self.request.user).order_by('-name')
         return queryset.filter(
             user=self.request.user
@@ -85,18 +113,72 @@ class IngredientViewSet(BaseRecipeViewSet):
     #     serializer.save(user=self.request.user)
 
 
+class BaseCatalogViewSet(RateLimitHeadersMixin,
+                         viewsets.GenericViewSet,
+                         mixins.ListModelMixin):
+    """Base viewset for the catalog shared by all users"""
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    pagination_class = CatalogPagination
+
+    def get_queryset(self):
+        """Return the entries starting with ?search=, most used first"""
+        queryset = self.queryset.filter(
+            user_count__gte=settings.CATALOG_MIN_USERS
+        )
+        search = self.request.query_params.get('search')
+        if search:
+            # names are stored normalized, a prefix of one is a range scan
+            # of the varchar_pattern_ops index Django adds next to the
+            # unique one on PostgreSQL (the unique index can't serve LIKE
+            # outside the C collation)
+            queryset = queryset.filter(name__startswith=catalog_name(search))
+        return queryset.order_by('-user_count', 'name')
+
+
+class CatalogTagViewSet(BaseCatalogViewSet):
+    """List the tags used across all users"""
+    queryset = CatalogTag.objects.all()
+    serializer_class = serializers.CatalogTagSerializer
+
+
+class CatalogIngredientViewSet(BaseCatalogViewSet):
+    """List the ingredients used across all users"""
+    queryset = CatalogIngredient.objects.all()
+    serializer_class = serializers.CatalogIngredientSerializer
+
+
 # ModelViewSet: creates all endpoints: CRUD
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(RateLimitHeadersMixin, viewsets.ModelViewSet):
     """Manage Recipes in the DB"""
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # per user limit on create/update/delete/upload, reads are free
+    throttle_classes = (UserWriteRateThrottle,)
+    prefetch = ('tags', 'ingredients')
 
-    def _params_to_ints(self, qs):
+    def _params_to_ints(self, qs, param):
         """Convert a list of string IDs to a list of integers"""
         # '1,2,3' ---> ['1', '2', '3'], int converts str to int ---> [1, 2, 3]
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return [int(str_id) for str_id in qs.split(',')]
+        except ValueError:
+            # a 400 naming the parameter instead of a server error
+            raise ValidationError({param: 'Expected comma separated ids.'})
+
+    def _ids_param(self):
+        """Return the unique ids of the required ?ids= parameter, in order"""
+        qs = self.request.query_params.get('ids')
+        if not qs:
+            raise ValidationError({'ids': 'This query parameter is required.'})
+        ids = list(dict.fromkeys(self._params_to_ints(qs, 'ids')))
+        if len(ids) > settings.RECIPE_IDS_LIMIT:
+            raise ValidationError({
+                'ids': f'At most {settings.RECIPE_IDS_LIMIT} recipes.'
+            })
+        return ids
 
     # default actions - overwritten
     # default queryset returns all recipes - overwrite
@@ -107,32 +189,242 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
         if tags:
-            tag_ids = self._params_to_ints(tags)
+            tag_ids = self._params_to_ints(tags, 'tags')
             # __ is used when filtering with foreign key of tags
             queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
+        # for cookable, ingredients are what the user has, not a filter
+        if ingredients and self.action != 'cookable':
+            ingredient_ids = self._params_to_ints(
+                ingredients, 'ingredients'
+            )
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
+        if tags or ingredients:
+            # a recipe matching several of the ids must be returned once
+            queryset = queryset.distinct()
+
         # return self.queryset.filter(user=self.request.user)
-        return queryset.filter(user=self.request.user)
+        queryset = queryset.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve', 'similar', 'publish'):
+            # they prefetch once they know what they will serialize
+            return queryset
+        # prefetch_related: tags and ingredients of all recipes are fetched
+        # in one query each instead of two queries per recipe (N+1)
+        return queryset.prefetch_related(*self.prefetch)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         # for retrieve action: return Detail serializer
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'batch'):
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
         # for all other actions, return default serializer
         return self.serializer_class
 
+    # Conditional requests: list and detail responses carry an ETag (and
+    # the detail a Last-Modified header). A client sending them back
+    # (If-None-Match / If-Modified-Since) gets a 304 without the recipes
+    # being serialized. Writes sending If-Match fail with 412 if the recipe
+    # changed since.
+
+    def recipe_etag(self, recipe):
+        return make_etag('recipe', recipe.pk, recipe.updated_at.isoformat())
+
+    def get_object_for_write(self):
+        """Return the recipe to write, after checking If-Match
+
+        Call it in a transaction: with If-Match, the recipe is read again
+        locked until the write commits, so no other write can come between
+        the check and this one.
+        """
+        instance = self.get_object()
+        if 'HTTP_IF_MATCH' in self.request.META:
+            instance = generics.get_object_or_404(
+                Recipe.objects.select_for_update(), pk=instance.pk
+            )
+            prefetch_related_objects([instance], *self.prefetch)
+            check_if_match(self.request, self.recipe_etag(instance))
+        return instance
+
+    def list(self, request, *args, **kwargs):
+        """List recipes, or 304 if none changed since the client's copy"""
+        recipes = list(self.filter_queryset(self.get_queryset()))
+        # the list changes when a recipe is added, changed or deleted. No
+        # Last-Modified: a recipe deleted or filtered out doesn't move the
+        # newest updated_at of those left
+        etag = make_etag(
+            'recipes', request.user.pk, request.get_full_path(),
+            *(f'{recipe.pk}@{recipe.updated_at.isoformat()}'
+              for recipe in recipes)
+        )
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        prefetch_related_objects(recipes, *self.prefetch)
+        serializer = self.get_serializer(recipes, many=True)
+        return set_validators(Response(serializer.data), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, or 304 if unchanged since the client's copy"""
+        instance = self.get_object()
+        etag = self.recipe_etag(instance)
+        response = not_modified(request, etag, instance.updated_at)
+        if response is not None:
+            return response
+
+        prefetch_related_objects([instance], *self.prefetch)
+        serializer = self.get_serializer(instance)
+        return set_validators(
+            Response(serializer.data), etag, instance.updated_at
+        )
+
+    def update(self, request, *args, **kwargs):
+        """Update a recipe, responding with the tags/ingredients just set"""
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic():
+            instance = self.get_object_for_write()
+            serializer = self.get_serializer(
+                instance,
+                data=request.data,
+                partial=partial
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        # unlike UpdateModelMixin.update, keep the prefetch cache: the
+        # serializer refreshed it with what it wrote, no need to query again
+        return set_validators(
+            Response(serializer.data),
+            self.recipe_etag(instance),
+            instance.updated_at
+        )
+
+    def destroy(self, request, *args, **kwargs):
+        """Delete a recipe, unless If-Match shows it changed meanwhile"""
+        with transaction.atomic():
+            self.perform_destroy(self.get_object_for_write())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     # ModelViewSet takes care of Recipe creation already. We just need to
     # assign it to a user
     def perform_create(self, serializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Hide the recipe now, purge_deleted removes it later"""
+        soft_delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
+    # path: recipe/recipes/summary, totals and statistics for dashboards
+    @action(methods=['GET'], detail=False)
+    def summary(self, request):
+        """Return a summary of the user's recipes, tags and ingredients"""
+        return Response(get_summary(request.user))
+
+    # path: recipe/recipes/cookable?ingredients=1,2,3&missing=1
+    @action(methods=['GET'], detail=False)
+    def cookable(self, request):
+        """Return recipes needing only the given ingredients
+
+        Recipes lacking at most `missing` of their ingredients are
+        included too, the ones lacking fewest first.
+        """
+        params = serializers.CookableQuerySerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        pantry = params.validated_data['ingredients']
+
+        # both counts come from one join with the ingredient links, no
+        # query per recipe or per ingredient
+        recipes = self.filter_queryset(self.get_queryset()).annotate(
+            ingredient_total=Count('ingredients', distinct=True),
+            ingredient_owned=Count(
+                'ingredients',
+                filter=Q(ingredients__in=pantry),
+                distinct=True
+            ),
+        ).annotate(
+            missing=F('ingredient_total') - F('ingredient_owned')
+        ).filter(
+            missing__lte=params.validated_data['missing']
+        ).order_by('missing', '-ingredient_owned', 'id')
+
+        results = []
+        for recipe in recipes:
+            data = self.get_serializer(recipe).data
+            data['missing_ingredients'] = [
+                pk for pk in data['ingredients'] if pk not in pantry
+            ]
+            results.append(data)
+        return Response(results)
+
+    # path: recipe/recipes/shopping-list?ids=1,2,3
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Return the ingredients of several recipes, grouped"""
+        return Response(shopping_list(request.user, self._ids_param()))
+
+    # path: recipe/recipes/batch?ids=1,2,3, details of several recipes
+    @action(methods=['GET'], detail=False)
+    def batch(self, request):
+        """Return the details of several recipes, in the requested order"""
+        ids = self._ids_param()
+        # prefetched: tags and ingredients of all of them in two queries
+        recipes = self.get_queryset().filter(id__in=ids).in_bulk()
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response({
+            'recipes': serializer.data,
+            # other users' recipes look the same as ones that don't exist
+            'missing': [pk for pk in ids if pk not in recipes],
+        })
+
+    # path: recipe/recipes/{recipe-id}/publish, POST to get a public link
+    # to the recipe, DELETE to revoke it
+    @action(methods=['POST', 'DELETE'], detail=True)
+    def publish(self, request, pk=None):
+        """Publish or unpublish a read-only public link to the recipe"""
+        recipe = self.get_object()
+        if request.method == 'DELETE':
+            PublishedRecipe.objects.filter(recipe=recipe).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        published = sharing.publish(recipe)
+        return Response({
+            'slug': published.slug,
+            'url': request.build_absolute_uri(
+                reverse('recipe:shared-recipe', args=[published.slug])
+            ),
+        }, status=status.HTTP_201_CREATED)
+
+    # path: recipe/recipes/{recipe-id}/similar, "more like this"
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Return the user's recipes sharing most tags and ingredients"""
+        recipe = self.get_object()
+        params = serializers.SimilarQuerySerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        ranked = similar_recipes(
+            request.user.pk, recipe.pk, **params.validated_data
+        )
+
+        recipes = Recipe.objects.filter(
+            user=request.user, id__in=[pk for _, pk in ranked]
+        ).prefetch_related(*self.prefetch).in_bulk()
+        results = []
+        for score, pk in ranked:
+            # deleted since the index was read
+            if pk in recipes:
+                data = self.get_serializer(recipes[pk]).data
+                data['similarity'] = round(score, 4)
+                results.append(data)
+        return Response(results)
+
     # custom action, method: post, detail True for specific recipe
     # path: recipe/{recipe-id}/upload-image
     @action(methods=['POST'], detail=True, url_path='upload-image')
@@ -150,6 +442,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             # save recipe serializer
             serializer.save()
+            # null clears the image, nothing was uploaded
+            image = serializer.validated_data.get('image')
+            if image:
+                metrics.upload_bytes.inc(
+                    image.size, view=f'{type(self).__name__}.{self.action}'
+                )
             # custom response
             return Response(
                 serializer.data,
@@ -160,3 +458,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,  # default DRF errors
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class SyncView(RateLimitHeadersMixin, generics.GenericAPIView):
+    """Return the user's data changed since a sync token"""
+    serializer_class = serializers.SyncQuerySerializer
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (UserWriteRateThrottle,)
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            get_sync(request.user, serializer.validated_data['since'])
+        )
+
+
+# A plain Django view, not DRF: no authentication, throttling or content
+# negotiation to run, the body is the snapshot rendered on publish.
+@require_safe
+def shared_recipe(request, slug):
+    """Return a published recipe, without querying the DB when cached"""
+    entry = sharing.get_shared(slug)
+    if entry is None:
+        return HttpResponseNotFound(
+            b'{"detail":"Not found."}', content_type='application/json'
+        )
+
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'].timestamp())
+    # CDNs purge by surrogate key when the recipe is edited
+    response['Surrogate-Key'] = sharing.surrogate_key(
+        slug.partition('-')[0]
+    )
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.SHARED_RECIPE_MAX_AGE,
+        s_maxage=settings.SHARED_RECIPE_S_MAXAGE
+    )
+    return get_conditional_response(
+        request,
+        etag=entry['etag'],
+        last_modified=int(entry['last_modified'].timestamp()),
+        response=response
+    )
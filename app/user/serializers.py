@@ -65,3 +65,9 @@ class AuthTokenSerializer(serializers.Serializer):
         # after validation is successful overwrite the user attr and return
         attrs['user'] = user
         return attrs
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    """Serializer for revoking auth tokens"""
+    # False: only the token used for the request, True: every device
+    all = serializers.BooleanField(default=False)
@@ -1,4 +1,6 @@
 from django.test import TestCase
+# cache holding the login/signup rate limit buckets
+from django.core.cache import cache
 # auth user model
 from django.contrib.auth import get_user_model
 # reverse: for generating api url
@@ -30,6 +32,8 @@ class PublicUserApiTests(TestCase):
     def setUp(self):
         # set up mock API client. So, no need to set up with each fn
         self.client = APIClient()
+        # start every test with full rate limit buckets
+        cache.clear()
 
     def test_create_valid_user_success(self):
         """Test creating user with valid payload is successful"""
@@ -163,3 +167,37 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_account(self):
+        """Test deleting the account closes it at once, keeping the data
+        for purge_deleted"""
+        login = {'email': 'test@bgwebagency.com', 'password': 'django1234'}
+        token = self.client.post(TOKEN_URL, login).data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        res = client.delete(ME_URL)
+        self.user.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+        self.assertEqual(
+            client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertEqual(
+            self.client.post(TOKEN_URL, login).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_delete_account_frees_email(self):
+        """Test the email of a deleted account can sign up again"""
+        self.client.delete(ME_URL)
+
+        res = APIClient().post(CREATE_USER_URL, {
+            'email': 'test@bgwebagency.com',
+            'password': 'django1234',
+            'name': 'Test',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
@@ -9,5 +9,10 @@ urlpatterns = [
     # user/create endpoint, name is used to identify this url for reverse
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path(
+        'token/revoke/',
+        views.RevokeTokenView.as_view(),
+        name='token-revoke'
+    ),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
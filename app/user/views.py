@@ -1,26 +1,73 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from core.authentication import ExpiringTokenAuthentication, revoke_tokens
+from core.deletion import soft_delete_user
+from core.models import AuthToken
+from core.throttling import AuthEmailRateThrottle, AuthIPRateThrottle, \
+    RateLimitHeadersMixin
+from user.serializers import UserSerializer, AuthTokenSerializer, \
+    RevokeTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(RateLimitHeadersMixin, generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
+    # DRF authenticates before throttling: with the default Basic/Session
+    # classes a Basic header would get its password hashed unthrottled
+    authentication_classes = ()
+    # password hashing is expensive, limit attempts per IP and per email
+    throttle_classes = (AuthIPRateThrottle, AuthEmailRateThrottle)
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(RateLimitHeadersMixin, ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
-    # Setting to Render the API endpoint to browser. otherwise, do curl
+    authentication_classes = ()
+    throttle_classes = (AuthIPRateThrottle, AuthEmailRateThrottle)
+    # ObtainAuthToken pins DRF's JSON classes, use the configured ones
+    # (browsable API in development, orjson)
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        # a new token per login, so each device can be revoked on its own
+        token = AuthToken.objects.create(
+            user=serializer.validated_data['user']
+        )
+        return Response({'token': token.key})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class RevokeTokenView(generics.GenericAPIView):
+    """Revoke the token used for the request, or all the user's tokens"""
+    serializer_class = RevokeTokenSerializer
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        tokens = AuthToken.objects.filter(user=request.user)
+        if not serializer.validated_data['all']:
+            tokens = tokens.filter(key=request.auth.key)
+        # one DELETE whatever the number of tokens
+        revoked = revoke_tokens(tokens)
+
+        return Response({'revoked': revoked}, status=status.HTTP_200_OK)
+
+
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated view"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
@@ -28,3 +75,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         # by default get_object returns entire user model
         # we will overwrite to return just the authenticated user
         return self.request.user
+
+    def perform_destroy(self, instance):
+        """Close the account now, purge_deleted removes its data later"""
+        soft_delete_user(instance)